@@ -4,19 +4,293 @@ These functions are not part of TriScale API
 (ie, not meant to be called by the user)
 """
 
+import bz2
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import hashlib
+import io
+import lzma
 import math
+import multiprocessing.shared_memory
+import os
+import pickle
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
 
 import numpy as np
 import pandas as pd
-import scipy
-import scipy.stats
+
+def as_array(values):
+    """
+    Return a NumPy view of array-like `values`, avoiding copies whenever
+    possible: NumPy arrays are returned as is, buffers (e.g., memoryview)
+    are wrapped with `np.asarray`, and Arrow arrays are exported with
+    `to_numpy(zero_copy_only=True)` (which only copies when the Arrow array
+    contains nulls, mapped to NaN).
+    """
+    if isinstance(values, np.ndarray):
+        return values
+    to_numpy = getattr(values, 'to_numpy', None)
+    if to_numpy is not None:
+        try:
+            return to_numpy(zero_copy_only=True)
+        except TypeError:
+            # pandas objects do not take `zero_copy_only`
+            return to_numpy()
+        except ValueError:
+            # Arrow arrays with nulls cannot be exported without a copy
+            return to_numpy(zero_copy_only=False)
+    return np.asarray(values)
+
+def split_archive_path(path):
+    """
+    Split a path to a member of a zip archive into the archive path and
+    the member name, e.g., 'campaign.zip/run_1/data.csv' into
+    ('campaign.zip', 'run_1/data.csv'). The member is None when `path`
+    does not go through a zip archive.
+    """
+    if os.path.exists(path):
+        return path, None
+    head = path
+    parts = []
+    while True:
+        head, tail = os.path.split(head)
+        if not tail or not head:
+            return path, None
+        parts.append(tail)
+        if os.path.isfile(head) and zipfile.is_zipfile(head):
+            return head, '/'.join(reversed(parts))
+
+def archive_members(archive, suffix=''):
+    """
+    Paths of the members of the zip `archive` whose name ends with
+    `suffix`, usable as data inputs (see `open_data`).
+    """
+    with zipfile.ZipFile(archive) as zip_file:
+        return [os.path.join(archive, name) for name in zip_file.namelist()
+                if name.endswith(suffix) and not name.endswith('/')]
+
+@contextlib.contextmanager
+def open_data(path):
+    """
+    Open a data file for reading (binary stream), decompressing on the fly.
+
+    `path` may be a plain file, or a member of a zip archive (e.g.,
+    'campaign.zip/run_1/data.csv'; a zip archive with a single member can
+    also be given directly). Files (or members) ending with '.gz', '.bz2',
+    '.xz'/'.lzma' or '.zst'/'.zstd' are decompressed while being read;
+    zstd requires the `zstandard` package. Nothing is extracted to disk.
+    """
+    with contextlib.ExitStack() as stack:
+        archive, member = split_archive_path(path)
+        if member is None and archive.lower().endswith('.zip') and zipfile.is_zipfile(archive):
+            with zipfile.ZipFile(archive) as zip_file:
+                names = [name for name in zip_file.namelist() if not name.endswith('/')]
+            if len(names) != 1:
+                raise ValueError("%s contains %i files: provide the path to one of them (e.g., %s)."
+                                 % (repr(path), len(names), repr(os.path.join(path, names[0]))))
+            member = names[0]
+
+        if member is None:
+            stream = stack.enter_context(open(path, 'rb'))
+            name = path
+        else:
+            zip_file = stack.enter_context(zipfile.ZipFile(archive))
+            try:
+                stream = stack.enter_context(zip_file.open(member))
+            except KeyError:
+                raise FileNotFoundError("No member %s in %s" % (repr(member), repr(archive)))
+            name = member
+
+        extension = os.path.splitext(name)[1].lower()
+        if extension == '.gz':
+            stream = stack.enter_context(gzip.GzipFile(fileobj=stream))
+        elif extension == '.bz2':
+            stream = stack.enter_context(bz2.BZ2File(stream))
+        elif extension in ['.xz', '.lzma']:
+            stream = stack.enter_context(lzma.LZMAFile(stream))
+        elif extension in ['.zst', '.zstd']:
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("Reading zstd files requires the 'zstandard' package.")
+            stream = stack.enter_context(zstandard.ZstdDecompressor().stream_reader(stream))
+
+        yield stream
+
+def read_csv_chunks(path, chunk_size, **kwargs):
+    """
+    Read a csv data file (see `open_data`) by chunks of `chunk_size` rows,
+    with `pd.read_csv(**kwargs)`. The file is opened immediately (missing
+    files raise FileNotFoundError here) and closed once all chunks are read.
+    """
+    stack = contextlib.ExitStack()
+    stream = stack.enter_context(open_data(path))
+    reader = pd.read_csv(stream, chunksize=chunk_size, **kwargs)
+
+    def chunks():
+        with stack:
+            yield from reader
+    return chunks()
+
+def valid_samples(x, y):
+    """
+    Drop the samples where `x` or `y` is missing (NaN/NaT).
+
+    The validity is computed as a mask; the inputs are returned unchanged
+    (no copy) when all samples are valid, which is the common case for
+    large traces.
+    """
+    valid = ~(pd.isna(x) | pd.isna(y))
+    if valid.all():
+        return x, y
+    return x[valid], y[valid]
+
+##
+# Numeric kernels: NumPy, or compiled with Numba (optional)
+##
+
+numba = None
+_backend = {'name': 'auto', 'available': None, 'kernels': None}
+_backend_lock = threading.Lock()
+
+def numba_available():
+    """Whether the `numba` package is installed (checked without importing it)."""
+    if _backend['available'] is None:
+        import importlib.util
+        _backend['available'] = importlib.util.find_spec('numba') is not None
+    return _backend['available']
+
+def set_backend(backend='auto'):
+    """
+    Select the implementation of the heaviest numeric kernels: the sorted
+    pairwise slopes of the Theil-Sen regressions, and the measures over
+    the windows of the convergence test.
+    - 'numba': compiled with Numba (on first use, then cached on disk),
+    parallel across the CPU cores. Requires the `numba` package.
+    - 'numpy': NumPy only.
+    - 'auto' (default): 'numba' if the package is installed and at least
+    4 CPU cores are usable, else 'numpy' (see `get_backend`). On a single
+    core, the Numba sorts and partitions are about 2x slower than NumPy's:
+    the kernels only pay off when spread over several cores.
+
+    Both backends return the same values, up to the rounding of the window
+    means (different summation order).
+
+    Returns the backend in use.
+    """
+    if backend not in ['auto', 'numba', 'numpy']:
+        raise ValueError("Unsupported backend: %r (use 'auto', 'numba' or 'numpy')" % backend)
+    if backend == 'numba' and not numba_available():
+        raise ImportError("The 'numba' backend requires the numba package")
+    _backend['name'] = backend
+    return get_backend()
+
+# Minimal number of usable CPU cores for the 'auto' backend to select Numba
+_numba_min_cores = 4
+
+def usable_cores():
+    """Number of CPU cores the current process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def get_backend():
+    """
+    The backend in use for the numeric kernels ('numba' or 'numpy').
+
+    With 'auto', 'numba' is used if the package is installed and the
+    process may run on at least 4 cores (`usable_cores`); otherwise,
+    'numpy'. Select 'numba' explicitly (`set_backend`) to use it on fewer
+    cores.
+    """
+    if _backend['name'] == 'auto':
+        if numba_available() and usable_cores() >= _numba_min_cores:
+            return 'numba'
+        return 'numpy'
+    return _backend['name']
+
+def _sorted_slopes_kernel(Y, x, first, second):
+    """Slopes between the samples `first` and `second` of each row of Y, sorted per row."""
+    slopes = np.empty((Y.shape[0], len(first)))
+    for pair in numba.prange(len(first)):
+        deltax = x[first[pair]] - x[second[pair]]
+        for row in range(Y.shape[0]):
+            slopes[row, pair] = (Y[row, first[pair]] - Y[row, second[pair]]) / deltax
+    for row in numba.prange(Y.shape[0]):
+        slopes[row].sort()
+    return slopes
+
+def _windows_measures_kernel(samples_y, starts, stops, codes, percentiles):
+    """
+    Measures over the windows samples_y[starts[i]:stops[i]], as
+    `window_measures`. The measures are encoded as `codes`: 0 for the mean,
+    1 for the minimum, 2 for the maximum, 3 for the percentile in `percentiles`.
+    """
+    metric_y = np.full((len(starts), len(codes)), np.nan)
+    for window in numba.prange(len(starts)):
+        start = starts[window]
+        stop = min(stops[window], len(samples_y))
+        if stop <= start:
+            continue
+        values = samples_y[start:stop]
+        n = stop - start
+        ranks = np.empty(2*len(codes), dtype=np.int64)
+        nb_ranks = 0
+        for j in range(len(codes)):
+            if codes[j] == 1:
+                ranks[nb_ranks] = 0
+                nb_ranks += 1
+            elif codes[j] == 2:
+                ranks[nb_ranks] = n-1
+                nb_ranks += 1
+            elif codes[j] == 3:
+                position = percentiles[j]/100 * (n-1)
+                ranks[nb_ranks] = int(np.floor(position))
+                ranks[nb_ranks+1] = int(np.ceil(position))
+                nb_ranks += 2
+        partitioned = values
+        if nb_ranks > 0:
+            partitioned = np.partition(values, np.sort(ranks[:nb_ranks]))
+        for j in range(len(codes)):
+            if codes[j] == 0:
+                total = 0.
+                for value in values:
+                    total += value
+                metric_y[window, j] = total / n
+            elif codes[j] == 1:
+                metric_y[window, j] = partitioned[0]
+            elif codes[j] == 2:
+                metric_y[window, j] = partitioned[n-1]
+            else:
+                position = percentiles[j]/100 * (n-1)
+                metric_y[window, j] = (partitioned[int(np.floor(position))]
+                                       + partitioned[int(np.ceil(position))]) / 2
+    return metric_y
+
+def _numba_kernels():
+    """The Numba-compiled kernels (compiled once per process, cached on disk)."""
+    global numba
+    with _backend_lock:
+        if _backend['kernels'] is None:
+            import numba
+            jit = numba.njit(parallel=True, cache=True, nogil=True)
+            _backend['kernels'] = {'sorted_slopes': jit(_sorted_slopes_kernel),
+                                   'windows_measures': jit(_windows_measures_kernel)}
+    return _backend['kernels']
 
 def theilslopes_normalized(y,x,confidence,y_bounds=[],x_bounds=[], tolerance_value=[], max_pairs=10000):
     """
     Extend stats.theilslopes
     -> https://docs.scipy.org/doc/scipy-0.17.1/reference/generated/scipy.stats.theilslopes.html
 
-    First normalize x and y to [-1;+1].
+    First normalize x and y to [-1;+1]. The regressions are computed by
+    `theilslopes_rows` (same outputs as `stats.theilslopes`).
     """
 
     ## Parse the inputs
@@ -53,7 +327,7 @@ def theilslopes_normalized(y,x,confidence,y_bounds=[],x_bounds=[], tolerance_val
         y = y[rand_index]
 
     ## Regression on original series
-    reg_orig = scipy.stats.theilslopes(y, x, confidence)
+    reg_orig = theilslopes_rows(y, x, confidence)[0]
 
     ## Normalization to [-1,+1]
     # x
@@ -66,7 +340,7 @@ def theilslopes_normalized(y,x,confidence,y_bounds=[],x_bounds=[], tolerance_val
     y = y/y_scale
 
     ## Regression on normalized series
-    reg_norm = scipy.stats.theilslopes(y, x, confidence)
+    reg_norm = theilslopes_rows(y, x, confidence)[0]
 
     # Compute the normalized trend coordinates
     coord_trend_norm = np.array([
@@ -91,28 +365,310 @@ def theilslopes_normalized(y,x,confidence,y_bounds=[],x_bounds=[], tolerance_val
 
     return np.array((reg_orig,reg_norm)), np.array(coord_trend_orig) , np.array(coord_tol_orig)
 
-def acorr(x):
-    if type(x) != np.ndarray:
-        x = np.array(x)
-    x = x - x.mean()
-    autocorr = np.correlate(x, x, mode='full')
-    autocorr = autocorr[x.size-1:]
-    if not np.isnan(autocorr.max()) and autocorr.max() != 0:
-        autocorr /= autocorr.max()
+def masked_autocorr(x, lengths=None):
+    """
+    Autocorrelation of the series x, where NaN values are missing samples.
+
+    The lag sums and the number of valid sample pairs for each lag are
+    computed with the FFTs of the (centered) data and of the validity mask,
+    in O(n log n). The lag covariance is estimated from the valid pairs only
+    and scaled by (n-k)/n, such that the result equals the usual (biased)
+    sample autocorrelation when there is no missing value [1].
+
+    If x is two-dimensional, the autocorrelation of each row is computed.
+    `lengths` then gives the length of each row; samples beyond are ignored.
+
+    Returns the autocorrelation coefficients, normalized to 1 at lag 0, and
+    the bounds of their 95% confidence interval if the series is i.i.d.
+    Without missing values, the bounds are +/-1.96/sqrt(n) [2]; the bound
+    of lag k widens by sqrt((n-k)/pairs_k) to account for the number of
+    valid pairs, pairs_k, actually available. It is infinite for lags
+    without any valid pair.
+
+    .. [1] E. Parzen, "On Spectral Analysis with Missing Observations and
+        Amplitude Modulation", Sankhya: The Indian Journal of Statistics,
+        Series A, 25(4):383-392, 1963.
+    .. [2] Peter J. Brockwell, Richard A. Davis, and Stephen E. Fienberg.
+        "Time Series: Theory and Methods: Theory and Methods." Springer Science
+        & Business Media, 1991.
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+    if lengths is None:
+        lengths = n
+    valid = ~np.isnan(x)
+    n_valid = valid.sum(axis=-1, keepdims=True)
+
+    # Centered data, zero where missing (the one extra buffer)
+    mean = np.divide(np.where(valid, x, 0.).sum(axis=-1, keepdims=True), n_valid,
+                     out=np.zeros(n_valid.shape), where=(n_valid > 0))
+    centered = np.where(valid, x - mean, 0.)
+
+    # Lag sums and number of valid pairs per lag
+    nfft = 2**int(np.ceil(np.log2(max(2*n-1, 1))))
+    spectrum = np.fft.rfft(centered, n=nfft, axis=-1)
+    sums = np.fft.irfft(spectrum.real**2 + spectrum.imag**2, n=nfft, axis=-1)[...,:n]
+    spectrum = np.fft.rfft(valid, n=nfft, axis=-1)
+    pairs = np.rint(np.fft.irfft(spectrum.real**2 + spectrum.imag**2, n=nfft, axis=-1)[...,:n])
+
+    # Lag covariance from valid pairs, with the usual (n-k)/n scaling
+    lags = np.arange(n)
+    taper = np.clip((lengths - lags) / np.maximum(lengths, 1), 0, None)
+    autocorr = np.divide(sums, pairs, out=np.zeros_like(sums), where=(pairs > 0)) * taper
+    lag0 = autocorr[...,:1]
+    autocorr = np.divide(autocorr, lag0, out=autocorr, where=(lag0 > 0))
+
+    # Bounds for the i.i.d. hypothesis
+    bounds = np.full(autocorr.shape, np.inf)
+    np.divide(taper, pairs, out=bounds, where=(pairs > 0))
+    bounds = 1.96 * np.sqrt(bounds)
+
+    return autocorr, bounds
 
+def acorr(x):
+    autocorr, _ = masked_autocorr(x)
     return autocorr
 
 def independence_test(x):
 
-    corr = acorr(x)
-    test = abs(corr[1:]) < (1.96/np.sqrt(len(x)))
+    corr, bounds = masked_autocorr(x)
+    test = abs(corr[1:]) < bounds[1:]
 
     if test.all():
         return True
     else:
         return False
 
+def periodogram(x):
+    """
+    Compute the periodogram of the equally spaced series x using the FFT,
+    in O(n log n).
+
+    Returns the periods (in number of samples) and the corresponding
+    spectral power. The zero frequency (i.e., the mean of the series) is
+    excluded, such that the shortest period returned is two samples.
+    Missing samples (NaN) are set to the mean of the series.
+    """
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    x = np.where(valid, x - np.nanmean(x), 0.)
+    power = np.abs(np.fft.rfft(x))**2 / max(valid.sum(), 1)
+    freqs = np.fft.rfftfreq(x.size)
+
+    return 1/freqs[1:], power[1:]
+
+def seasonal_periods(x, confidence=95, max_periods=3):
+    """
+    Identify the dominant seasonal periods of the series x.
+
+    A period is retained if it is a local maximum of the periodogram and
+    its power is significantly larger than expected for white noise
+    (Fisher's test: the periodogram ordinates of white noise are
+    exponentially distributed, so the largest of m ordinates exceeds
+    mean(power)*ln(m/alpha) with probability alpha).
 
+    Returns the periods (in number of samples) and their power, sorted by
+    decreasing power.
+    """
+    periods, power = periodogram(x)
+    if power.size < 3 or power.mean() == 0:
+        return np.array([]), np.array([])
+
+    # White-noise threshold
+    alpha = 1 - confidence/100
+    threshold = power.mean() * np.log(power.size / alpha)
+
+    # Local maxima of the spectrum
+    is_peak = np.concatenate((
+        [power[0] > power[1]],
+        (power[1:-1] > power[:-2]) & (power[1:-1] >= power[2:]),
+        [power[-1] > power[-2]]))
+    candidates = np.flatnonzero(is_peak & (power > threshold))
+
+    # Keep the strongest ones
+    candidates = candidates[np.argsort(power[candidates])[::-1]][:max_periods]
+
+    return periods[candidates], power[candidates]
+
+def window_independence(x, max_window):
+    """
+    Run the independence test on the series of means of x over
+    non-overlapping windows, for every window size from 1 to `max_window`.
+
+    All window means derive from a single cumulative sum. Window sizes are
+    grouped by powers of two, such that all series within a group have
+    similar lengths: their autocorrelations are computed with one batched
+    FFT per group, instead of one test per window size.
+
+    Missing samples (NaN) are ignored when averaging over windows.
+
+    Returns the window sizes and the outcome of the independence test for
+    each of them (same semantics as `independence_test`).
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.size
+    valid = ~np.isnan(x)
+    cumsum = np.concatenate(([0.], np.cumsum(np.where(valid, x, 0.))))
+    cumcount = np.concatenate(([0], np.cumsum(valid)))
+
+    window_sizes = np.arange(1, max_window+1)
+    independent = np.zeros(window_sizes.size, dtype=bool)
+    groups = np.floor(np.log2(window_sizes)).astype(int)
+
+    for group in np.unique(groups):
+        in_group = (groups == group)
+        sizes = window_sizes[in_group][:,None]
+        lengths = n // sizes
+        L = int(lengths.max())
+        cols = np.arange(L)[None,:]
+
+        # Window means, NaN for empty windows and beyond the series length
+        starts = np.minimum(cols*sizes, n)
+        stops = np.minimum(starts+sizes, n)
+        counts = np.where(cols < lengths, cumcount[stops] - cumcount[starts], 0)
+        means = np.full(counts.shape, np.nan)
+        np.divide(cumsum[stops]-cumsum[starts], counts, out=means, where=(counts > 0))
+
+        # Autocorrelation of all series at once
+        autocorr, bounds = masked_autocorr(means, lengths)
+        exceeds = np.abs(autocorr[:,1:]) >= bounds[:,1:]
+        independent[in_group] = ~exceeds.any(axis=1)
+
+    return window_sizes, independent
+
+
+
+# Change-point segmentations already computed, keyed by series content
+_segmentation_cache = collections.OrderedDict()
+_segmentation_cache_size = 32
+_segmentation_lock = threading.Lock()
+
+def changepoint_segmentation(x, penalty=None, min_size=10, stride=None):
+    """
+    Segment the series x into pieces of constant mean using PELT [1]
+    (optimal partitioning with pruning of the candidate change points).
+
+    The cost of a segment is its sum of squared deviations from the segment
+    mean, computed in O(1) from cumulative sums. NaN values are ignored.
+
+    Pruning only keeps the number of candidate change points bounded when
+    the series has change points: on long stationary series, every sample
+    remains a candidate and exact PELT is quadratic. Hence, the change
+    points are first searched every `stride` samples (None: len(x)//4096,
+    at least 1), then among the samples within one stride of the change
+    points found. Each pass only evaluates the optimal cost at its
+    candidate change points: the complexity is linear in the length of x
+    (month-long series of 10 s samples take well under a second), and the
+    change points are exact when they are at least a few strides apart;
+    `stride=1` gives the exact (optimal) segmentation.
+
+    When `penalty` is None, a BIC-type penalty 2*sigma^2*log(n) is used,
+    where the noise level sigma is estimated robustly (MAD) from the first
+    differences of the series.
+
+    Results are cached per series content and parameters.
+
+    Returns the segment boundaries: an array starting with 0 and ending
+    with len(x), such that segment k spans x[bounds[k]:bounds[k+1]].
+
+    .. [1] R. Killick, P. Fearnhead, and I. A. Eckley, "Optimal Detection of
+        Changepoints With a Linear Computational Cost", Journal of the
+        American Statistical Association, 107(500):1590-1598, 2012.
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.size
+
+    key = ( hashlib.blake2b(x.tobytes(), digest_size=16).hexdigest(),
+            penalty,
+            min_size,
+            stride)
+    with _segmentation_lock:
+        if key in _segmentation_cache:
+            _segmentation_cache.move_to_end(key)
+            return _segmentation_cache[key].copy()
+
+    ## Cumulative sums (NaNs ignored)
+    valid = ~np.isnan(x)
+    if valid.any():
+        x = np.where(valid, x - x[valid].mean(), 0.)
+    else:
+        x = np.zeros(n)
+    S1 = np.concatenate(([0.], np.cumsum(x)))
+    S2 = np.concatenate(([0.], np.cumsum(x**2)))
+    C  = np.concatenate(([0], np.cumsum(valid)))
+
+    ## Penalty
+    if penalty is None:
+        diffs = np.diff(x[valid])
+        if diffs.size:
+            sigma = 1.4826 * np.median(np.abs(diffs - np.median(diffs))) / np.sqrt(2)
+        else:
+            sigma = 0
+        if sigma == 0:
+            sigma = max(np.sqrt(S2[-1]/max(C[-1],1)), 1e-12)
+        penalty = 2 * sigma**2 * np.log(max(n,2))
+
+    def cost(s, t):
+        count = C[t] - C[s]
+        sums = S1[t] - S1[s]
+        return (S2[t] - S2[s]) - np.divide(sums**2, count,
+                                           out=np.zeros_like(sums),
+                                           where=(count > 0))
+
+    ## PELT
+    def pelt(admissible):
+        """Optimal segmentation with change points where `admissible` is True."""
+        F = np.full(n+1, np.inf)
+        F[0] = -penalty
+        last_change = np.zeros(n+1, dtype=int)
+        # Candidate change points: the first `nb_candidates` of a preallocated
+        # buffer, pruned in place
+        candidates = np.zeros(n+1, dtype=int)
+        nb_candidates = 1
+        # F is only needed at the admissible change points, and at n
+        positions = np.flatnonzero(admissible[:n+1])
+        positions = positions[(positions >= min_size) & (positions <= n - min_size)]
+        next_position = 0
+        for t in np.append(positions, n):
+            # New admissible change points (leaving at least min_size samples)
+            while next_position < positions.size and positions[next_position] <= t - min_size:
+                candidates[nb_candidates] = positions[next_position]
+                nb_candidates += 1
+                next_position += 1
+            current = candidates[:nb_candidates]
+            total = F[current] + cost(current, t)
+            best = np.argmin(total)
+            F[t] = total[best] + penalty
+            last_change[t] = current[best]
+            # Pruning
+            kept = current[total <= F[t]]
+            nb_candidates = kept.size
+            candidates[:nb_candidates] = kept
+
+        ## Backtracking
+        bounds = [n]
+        while bounds[-1] > 0:
+            bounds.append(last_change[bounds[-1]])
+        return np.array(bounds[::-1])
+
+    if stride is None:
+        stride = max(1, n // 4096)
+    positions = np.arange(n+1)
+    bounds = pelt(positions % stride == 0)
+    if stride > 1:
+        # Second pass, with the change points within one stride of the
+        # first-pass ones
+        nearest = np.searchsorted(bounds, positions)
+        distance = np.minimum(np.abs(positions - bounds[np.minimum(nearest, len(bounds)-1)]),
+                              np.abs(positions - bounds[np.maximum(nearest-1, 0)]))
+        bounds = pelt(distance < stride)
+
+    with _segmentation_lock:
+        _segmentation_cache[key] = bounds
+        if len(_segmentation_cache) > _segmentation_cache_size:
+            _segmentation_cache.popitem(last=False)
+
+    return bounds.copy()
 
 def theil_convergence_test(x, y, y_bounds, confidence, tolerance, verbose=False):
 
@@ -180,6 +736,585 @@ def convergence_test(x, y, y_bounds, confidence, tolerance, verbose=False):
 
     return results
 
+def sorted_percentile(sorted_values, percentile):
+    """
+    Percentile of an already sorted array, with 'midpoint' interpolation
+    (same as `np.percentile`): a single index lookup.
+    """
+    position = percentile/100 * (len(sorted_values)-1)
+    lower = int(np.floor(position))
+    upper = int(np.ceil(position))
+    return (sorted_values[lower] + sorted_values[upper]) / 2
+
+def merge_sorted(first, second):
+    """
+    Merge two sorted arrays in linear time (plus the binary searches
+    locating the elements of `second` in `first`).
+    """
+    positions = np.searchsorted(first, second, side='right') + np.arange(len(second))
+    merged = np.empty(len(first) + len(second), dtype=np.result_type(first, second))
+    from_second = np.zeros(len(merged), dtype=bool)
+    from_second[positions] = True
+    merged[positions] = second
+    merged[~from_second] = first
+    return merged
+
+def pooled_order_statistic(sorted_arrays, rank):
+    """
+    Order statistic of rank `rank` (0 is the minimum) of the union of
+    several sorted arrays, without merging them.
+
+    Selection by weighted median: at each step, the pivot is the median of
+    the medians of the remaining candidate ranges (weighted by their
+    sizes), and its rank is obtained with one binary search per array. At
+    least a quarter of the remaining candidates is discarded at each step,
+    so the cost is O(k log n) per step (k arrays of length up to n), for
+    O(log N) steps (N values in total).
+    """
+    lo = np.zeros(len(sorted_arrays), dtype=np.int64)
+    hi = np.array([len(array) for array in sorted_arrays], dtype=np.int64)
+    if rank < 0 or rank >= hi.sum():
+        raise ValueError("Invalid rank: "+repr(rank)+". The arrays contain "+repr(int(hi.sum()))+" values.")
+
+    while True:
+        active = np.flatnonzero(hi > lo)
+        sizes = hi[active] - lo[active]
+
+        # Weighted median of the medians of the candidate ranges
+        medians = np.array([sorted_arrays[i][lo[i] + (size-1)//2]
+                            for i, size in zip(active, sizes)])
+        order = np.argsort(medians, kind='stable')
+        weights = np.cumsum(sizes[order])
+        pivot = medians[order[np.searchsorted(weights, weights[-1]/2)]]
+
+        # Rank of the pivot among the candidates
+        less = np.array([np.searchsorted(sorted_arrays[i][lo[i]:hi[i]], pivot, side='left')
+                         for i in active])
+        less_equal = np.array([np.searchsorted(sorted_arrays[i][lo[i]:hi[i]], pivot, side='right')
+                               for i in active])
+        if rank < less.sum():
+            hi[active] = lo[active] + less
+        elif rank < less_equal.sum():
+            return pivot
+        else:
+            rank -= less_equal.sum()
+            lo[active] = lo[active] + less_equal
+
+def window_measures(values, measures):
+    """
+    Compute several measures ('mean', 'minimum', 'maximum' or percentiles)
+    over one window of samples.
+
+    A single partition of the window provides all the order statistics
+    required by the minimum, maximum and percentiles ('midpoint'
+    interpolation, as `np.percentile`). The mean is accumulated in float64,
+    whatever the type of the values.
+    """
+    n = len(values)
+    ranks = set()
+    for measure in measures:
+        if isinstance(measure, str):
+            if measure == 'minimum':
+                ranks.add(0)
+            elif measure == 'maximum':
+                ranks.add(n-1)
+            elif measure != 'mean':
+                raise ValueError('Unsupported measure')
+        else:
+            position = measure/100 * (n-1)
+            ranks.update((int(np.floor(position)), int(np.ceil(position))))
+    if ranks:
+        partitioned = np.partition(values, sorted(ranks))
+
+    output = []
+    for measure in measures:
+        if isinstance(measure, str):
+            if measure == 'mean':
+                output.append(np.mean(values, dtype=np.float64))
+            elif measure == 'minimum':
+                output.append(partitioned[0])
+            else:
+                output.append(partitioned[n-1])
+        else:
+            output.append(sorted_percentile(partitioned, measure))
+
+    return output
+
+def windows_measures(samples_y, starts, stops, measure):
+    """
+    Compute `measure` over the windows `samples_y[starts[i]:stops[i]]`.
+
+    The windows are views of `samples_y` (no copy). Empty windows yield NaN.
+    `measure` may be a list of measures, in which case all measures are
+    computed from one partition of each window.
+
+    The windows are processed in parallel by the 'numba' backend, if
+    selected (see `set_backend`).
+
+    Returns the measure values (one row per measure if `measure` is a list).
+    """
+    if isinstance(measure, (list, tuple)):
+        measures = measure
+    else:
+        measures = [measure]
+
+    if get_backend() == 'numba' and np.asarray(samples_y).dtype.kind in 'fiu':
+        codes = []
+        for measure_i in measures:
+            if not isinstance(measure_i, str):
+                codes.append(3)
+            elif measure_i in ['mean', 'minimum', 'maximum']:
+                codes.append(['mean', 'minimum', 'maximum'].index(measure_i))
+            else:
+                raise ValueError('Unsupported measure')
+        percentiles = [0. if isinstance(measure_i, str) else measure_i for measure_i in measures]
+        metric_y = _numba_kernels()['windows_measures'](np.asarray(samples_y),
+                                                        np.asarray(starts, dtype=np.int64),
+                                                        np.asarray(stops, dtype=np.int64),
+                                                        np.array(codes, dtype=np.int64),
+                                                        np.array(percentiles, dtype=np.float64))
+    else:
+        metric_y = np.full((len(starts), len(measures)), np.nan)
+        for i, (start_index, stop_index) in enumerate(zip(starts, stops)):
+            if stop_index > start_index:
+                metric_y[i] = window_measures(samples_y[start_index:stop_index], measures)
+
+    metric_y = metric_y.T
+    if measures is not measure:
+        metric_y = metric_y[0]
+
+    return metric_y
+
+def convergence_windows(samples_x, window='fixed', nb_windows=100):
+    """
+    Windows of TriScale's convergence test, for samples with x values
+    `samples_x` (only read for 'time' windows, and at the x value of each
+    window):
+    - 'fixed': (at most) `nb_windows` sliding windows, each containing half
+    of the samples; the x value is the sample in the middle of the window.
+    - 'expanding': (at most) 100 prefixes of the samples, from half to all
+    of the samples.
+    - 'time': `nb_windows` sliding windows, each spanning half of the time
+    covered by the samples (`samples_x` must be sorted); the window
+    boundaries are obtained with a single `np.searchsorted` call, and
+    windows without samples are dropped. The x value is the time in the
+    middle of the window.
+
+    Returns the x values, and the index bounds of the windows (window i
+    covers the samples starts[i]:stops[i]).
+    """
+    n = len(samples_x)
+
+    if window == 'fixed':
+        nb_chuncks = min(int(n/2)+1, nb_windows)
+        chunck_len = int(n/2)
+        step = chunck_len/(nb_chuncks-1)
+        starts = (np.arange(nb_chuncks)*step).astype(int)
+        stops = starts + chunck_len
+        # Show the sample in the middle of the sliding window
+        metric_x = np.asarray(samples_x[(starts + chunck_len/2).astype(int)])
+
+    elif window == 'expanding':
+        if n > 200:
+            nb_chuncks = 200
+        else:
+            nb_chuncks = n
+        chuncks = np.arange(int(nb_chuncks/2))
+        chunck_x = chuncks*2+1
+        stops = ((nb_chuncks/2+chuncks).astype(int)*n/nb_chuncks).astype(int)
+        starts = np.zeros(len(stops), dtype=int)
+        metric_x = np.asarray(samples_x[(chunck_x*n/nb_chuncks).astype(int)])
+
+    elif window == 'time':
+        x_first = samples_x[0]
+        if np.any(samples_x[1:] < samples_x[:-1]):
+            raise ValueError("Time-based windows require sorted 'x' values.")
+        span = (samples_x[-1] - x_first)/2
+        starts_x = x_first + np.linspace(0, 1, nb_windows)*span
+        # Window i is [starts_x[i], starts_x[i]+span), the last one closed on the right
+        boundaries = np.searchsorted(samples_x,
+                                     np.concatenate((starts_x, starts_x + span)))
+        starts, stops = boundaries[:nb_windows], boundaries[nb_windows:]
+        stops[-1] = n
+        non_empty = stops > starts
+        metric_x = (starts_x + span/2)[non_empty]
+        starts, stops = starts[non_empty], stops[non_empty]
+
+    else:
+        raise ValueError("Invalid window: "+repr(window)+". Valid 'window' values: 'fixed', 'expanding' or 'time'")
+
+    return metric_x, starts, stops
+
+def sliding_window_measures(samples_x, samples_y, measure):
+    """
+    Compute the metric series used for TriScale's convergence test:
+    `measure` over (at most) 100 sliding windows, each containing half of
+    the samples.
+
+    `measure` may be a list of measures, in which case all measures are
+    computed from one partition of each window.
+
+    Returns the x values (sample in the middle of each window) and the
+    measure values (one row per measure if `measure` is a list).
+    """
+    metric_x, starts, stops = convergence_windows(samples_x, 'fixed')
+    return metric_x, windows_measures(samples_y, starts, stops, measure)
+
+def time_window_measures(samples_x, samples_y, measure, nb_windows=100):
+    """
+    Compute the metric series used for TriScale's convergence test with
+    time-based windows: `measure` over `nb_windows` sliding windows, each
+    spanning half of the time covered by the samples (whatever the number
+    of samples they contain).
+
+    `samples_x` must be sorted. The boundaries of all windows are obtained
+    with a single `np.searchsorted` call on `samples_x`; the windows are
+    then views of `samples_y`, so bursty traces need no resampling. Windows
+    without samples are dropped.
+
+    Returns the x values (time in the middle of each window) and the
+    measure values (one row per measure if `measure` is a list).
+    """
+    metric_x, starts, stops = convergence_windows(np.asarray(samples_x), 'time', nb_windows)
+    return metric_x, windows_measures(samples_y, starts, stops, measure)
+
+def expanding_window_measures(samples_x, samples_y, measure):
+    """
+    Compute the metric series used for TriScale's convergence test with
+    windows of increasing size: `measure` over (at most) 100 prefixes of
+    the samples, from half to all of the samples.
+
+    The measures are computed incrementally. For 'mean', 'minimum' and
+    'maximum', from cumulative sums (in float64), minima and maxima. For percentiles,
+    the sorted prefix grows by merging each new (sorted) chunk of samples,
+    such that every percentile is a single index lookup; the total cost is
+    O(n log n) for the sorts plus one linear merge per window.
+
+    `measure` may be a list of measures, in which case the sorted prefix is
+    shared by all percentiles.
+
+    Returns the x values and the measure values (one row per measure if
+    `measure` is a list).
+    """
+    if isinstance(measure, (list, tuple)):
+        measures = measure
+    else:
+        measures = [measure]
+
+    metric_x, _, chunck_len = convergence_windows(samples_x, 'expanding')
+
+    metric_y = np.empty((len(measures), len(chunck_len)))
+    percentiles = []
+    for row, row_measure in enumerate(measures):
+        if isinstance(row_measure, str):
+            if row_measure == 'mean':
+                metric_y[row] = np.cumsum(samples_y, dtype=np.float64)[chunck_len-1] / chunck_len
+            elif row_measure == 'minimum':
+                metric_y[row] = np.minimum.accumulate(samples_y)[chunck_len-1]
+            elif row_measure == 'maximum':
+                metric_y[row] = np.maximum.accumulate(samples_y)[chunck_len-1]
+            else:
+                raise ValueError('Unsupported measure')
+        else:
+            percentiles.append(row)
+
+    if percentiles:
+        sorted_prefix = np.sort(samples_y[:chunck_len[0]])
+        for k in range(len(chunck_len)):
+            if k > 0 and chunck_len[k] > chunck_len[k-1]:
+                sorted_prefix = merge_sorted(sorted_prefix,
+                                             np.sort(samples_y[chunck_len[k-1]:chunck_len[k]]))
+            for row in percentiles:
+                metric_y[row,k] = sorted_percentile(sorted_prefix, measures[row])
+
+    if measures is not measure:
+        metric_y = metric_y[0]
+
+    return metric_x, metric_y
+
+def theilslopes_rows(Y, x, confidence):
+    """
+    Theil-Sen regression of each row of Y against the shared x values.
+
+    Same outputs as `scipy.stats.theilslopes` (slope, intercept, lower and
+    upper bound of the CI on the slope), one row per row of Y, but the
+    pairwise slopes of all rows are computed and sorted at once (in
+    parallel with the 'numba' backend, see `set_backend`).
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    x = np.asarray(x, dtype=float)
+
+    # Pairwise slopes where deltax > 0, for all rows
+    first, second = np.nonzero((x[:,np.newaxis] - x) > 0)
+    if get_backend() == 'numba':
+        slopes = _numba_kernels()['sorted_slopes'](Y, x, first, second)
+    else:
+        slopes = (Y[:,first] - Y[:,second]) / (x[first] - x[second])
+        slopes.sort(axis=1)
+    medslope = np.median(slopes, axis=1)
+    medinter = np.median(Y, axis=1) - medslope * np.median(x)
+
+    # Confidence intervals, following (2.6) from Sen (1968)
+    import scipy.stats
+    alpha = confidence
+    if alpha > 0.5:
+        alpha = 1. - alpha
+    z = scipy.stats.norm.ppf(alpha / 2.)
+    def repeats_term(values):
+        _, counts = np.unique(values, return_counts=True)
+        counts = counts[counts > 1]
+        return np.sum(counts * (counts-1) * (2*counts + 5))
+    nt = slopes.shape[1]
+    ny = Y.shape[1]
+    sigsq = 1/18. * (ny * (ny-1) * (2*ny+5)
+                     - repeats_term(x)
+                     - np.array([repeats_term(y) for y in Y]))
+    # With heavy ties, sigsq may be negative; without slopes (all x equal),
+    # there is no bound: the CI is then NaN, as with `stats.theilslopes`
+    valid = (sigsq >= 0) & (nt > 0)
+    sigma = np.sqrt(np.where(valid, sigsq, 0.))
+    Ru = np.minimum(np.round((nt - z*sigma)/2.).astype(int), nt-1)
+    Rl = np.maximum(np.round((nt + z*sigma)/2.).astype(int) - 1, 0)
+    rows = np.nonzero(valid)[0]
+    low = np.full(Y.shape[0], np.nan)
+    high = np.full(Y.shape[0], np.nan)
+    low[rows] = slopes[rows,Rl[rows]]
+    high[rows] = slopes[rows,Ru[rows]]
+
+    return np.stack((medslope, medinter, low, high), axis=1)
+
+def convergence_test_rows(x, Y, y_bounds, confidence, tolerance, verbose=False):
+    """
+    TriScale's convergence test for each row of Y against the shared x
+    values, with one vectorized Theil-Sen regression for all rows.
+
+    `y_bounds` contains the normalization bounds for each row.
+    Returns the list of results, each as returned by `convergence_test`.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    x = np.asarray(x, dtype=float)
+    tolerance = abs(tolerance/100)
+
+    x_min = x.min()
+    x_max = x.max()
+
+    # Randomly subsample x and Y if they grow too big (as theilslopes_normalized)
+    max_pairs = 10000
+    if (len(x)**2 - len(x)) > max_pairs:
+        max_samples = int(np.floor(np.sqrt(max_pairs)))
+        rand_index = np.random.choice(len(x), max_samples, replace=False)
+        x = x[rand_index]
+        Y = Y[:,rand_index]
+
+    ## Normalization to [-1,+1]
+    x = (2*x - (x_min + x_max)) / (x_max-x_min)
+    y_min = np.array([bounds[0] for bounds in y_bounds], dtype=float)[:,np.newaxis]
+    y_max = np.array([bounds[1] for bounds in y_bounds], dtype=float)[:,np.newaxis]
+    y_scale = y_max-y_min
+    Y = (2*Y - (y_min + y_max)) / y_scale
+
+    ## Regression on the normalized series
+    reg = theilslopes_rows(Y, x, confidence/100)
+
+    results = []
+    for k in range(Y.shape[0]):
+        coord_trend_norm = np.array([
+            reg[k,1] - reg[k,0],  # med_min
+            reg[k,1] + reg[k,0],  # med_max
+            reg[k,1] - reg[k,2],  # lo_min
+            reg[k,1] + reg[k,2],  # lo_max
+            reg[k,1] - reg[k,3],  # up_min
+            reg[k,1] + reg[k,3]]) # up_max
+        coord_tol_norm = np.array([
+            reg[k,1] + tolerance,  # lo_min
+            reg[k,1] - tolerance,  # lo_max
+            reg[k,1] - tolerance,  # up_min
+            reg[k,1] + tolerance]) # up_max
+        # Revert y normalization to get coordinates in the original scale
+        coord_trend = (coord_trend_norm * y_scale[k] + y_min[k] + y_max[k])/2
+        coord_tol = (coord_tol_norm * y_scale[k] + y_min[k] + y_max[k])/2
+
+        has_converged = not (reg[k,2] < -tolerance or reg[k,3] > tolerance)
+        if verbose:
+            print('%g%% CI (scaled): \t[%s , %s]\tTolerance: [-%s , %s]\t%s'
+                  % (confidence, reg[k,2], reg[k,3], tolerance, tolerance,
+                     'stationary' if has_converged else 'Non-stationary'))
+        results.append((has_converged, coord_trend, coord_tol))
+
+    return results
+
+def convergence_status(x, y, y_bounds, confidence, tolerance):
+    """
+    Outcome of TriScale's convergence test, with early failure detection.
+
+    Same test as `convergence_test` (`tolerance` in %), but with three
+    possible outcomes:
+    - 'passed' if the CI on the normalized trend is within the tolerance;
+    - 'failed' if the CI lies entirely outside the tolerance, i.e., the
+    trend clearly exceeds it;
+    - 'pending' otherwise.
+    """
+    reg_all, _, _ = theilslopes_normalized( y,
+                                            x,
+                                            confidence/100,
+                                            y_bounds=y_bounds,
+                                            tolerance_value=tolerance/100)
+    reg = reg_all[1,:]
+    tolerance = abs(tolerance/100)
+
+    if reg[2] >= -tolerance and reg[3] <= tolerance:
+        return 'passed'
+    elif reg[2] > tolerance or reg[3] < -tolerance:
+        return 'failed'
+    else:
+        return 'pending'
+
+def stream_block(x, y, sketch_size):
+    """
+    Summary of a block of consecutive samples of a stream:
+    count, sum, min, max, first x value, and a sketch of the distribution
+    of y made of (at most) `sketch_size` evenly spaced order statistics,
+    each weighted by the number of samples it represents.
+    """
+    values = np.sort(y)
+    weights = np.ones(values.size)
+    if values.size > sketch_size:
+        ranks = np.linspace(0, values.size-1, sketch_size).round().astype(int)
+        values = values[ranks]
+        weights = np.full(sketch_size, y.size/sketch_size)
+
+    return {'count': y.size,
+            'sum': y.sum(),
+            'min': values[0],
+            'max': values[-1],
+            'x': x[0],
+            'values': values,
+            'weights': weights}
+
+def merge_stream_blocks(first, second, sketch_size):
+    """
+    Merge the summaries of two consecutive stream blocks.
+    """
+    values = np.concatenate((first['values'], second['values']))
+    weights = np.concatenate((first['weights'], second['weights']))
+    order = np.argsort(values, kind='mergesort')
+    values = values[order]
+    weights = weights[order]
+
+    # Downsample the merged sketch to evenly spaced cumulative weights
+    if values.size > sketch_size:
+        cum_weights = np.cumsum(weights)
+        targets = np.linspace(0, cum_weights[-1], sketch_size+1)[1:]
+        ranks = np.minimum(np.searchsorted(cum_weights, targets), values.size-1)
+        values = values[ranks]
+        weights = np.full(sketch_size, cum_weights[-1]/sketch_size)
+
+    return {'count': first['count'] + second['count'],
+            'sum': first['sum'] + second['sum'],
+            'min': min(first['min'], second['min']),
+            'max': max(first['max'], second['max']),
+            'x': first['x'],
+            'values': values,
+            'weights': weights}
+
+def stream_window_measure(blocks, measure):
+    """
+    Compute `measure` ('mean', 'minimum', 'maximum' or a percentile)
+    over the samples summarized by a list of consecutive stream blocks.
+
+    Mean, minimum and maximum are exact. Percentiles are exact as long as
+    the blocks have not been sketched; they are approximated from the
+    weighted sketches otherwise.
+    """
+    if isinstance(measure, str):
+        if measure == 'mean':
+            return (sum(block['sum'] for block in blocks)
+                    / sum(block['count'] for block in blocks))
+        elif measure == 'minimum':
+            return min(block['min'] for block in blocks)
+        elif measure == 'maximum':
+            return max(block['max'] for block in blocks)
+        else:
+            raise ValueError('Unsupported measure')
+
+    values = np.concatenate([block['values'] for block in blocks])
+    if all(block['count'] == block['values'].size for block in blocks):
+        return np.percentile(values, measure, interpolation='midpoint')
+
+    weights = np.concatenate([block['weights'] for block in blocks])
+    order = np.argsort(values)
+    cum_weights = np.cumsum(weights[order])
+    rank = np.searchsorted(cum_weights, measure/100 * cum_weights[-1])
+    return values[order][min(rank, values.size-1)]
+
+##
+# Binomial distribution
+##
+
+_log_factorials = np.zeros(1)
+
+def _log_factorial(n):
+    """log(k!) for k = 0..n (computed with `math.lgamma`, and cached)."""
+    global _log_factorials
+    if len(_log_factorials) <= n:
+        _log_factorials = np.array([math.lgamma(k+1) for k in range(max(n+1, 2*len(_log_factorials)))])
+    return _log_factorials[:n+1]
+
+def binom_pmf(n, p):
+    """
+    Probability mass function of the binomial distribution B(n, p), for
+    k = 0..n, computed in log space (no overflow nor underflow of the
+    binomial coefficients, for any n).
+    """
+    k = np.arange(n+1)
+    log_factorial = _log_factorial(n)
+    if p == 0 or p == 1:
+        pmf = np.zeros(n+1)
+        pmf[0 if p == 0 else n] = 1.
+        return pmf
+    log_pmf = (log_factorial[n] - log_factorial - log_factorial[::-1]
+               + k*math.log(p) + (n-k)*math.log1p(-p))
+    return np.exp(log_pmf)
+
+def binom_cdf(n, p):
+    """P(X <= k) for X ~ B(n, p), for k = 0..n."""
+    return np.minimum(np.cumsum(binom_pmf(n, p)), 1.)
+
+def binom_sf(n, p):
+    """
+    P(X > k) for X ~ B(n, p), for k = 0..n. The upper tail is summed from
+    k = n downwards, so that small tail probabilities keep their precision
+    (no cancellation in 1 - cdf).
+    """
+    pmf = binom_pmf(n, p)
+    sf = np.zeros(n+1)
+    sf[:-1] = np.minimum(np.cumsum(pmf[:0:-1])[::-1], 1.)
+    return sf
+
+def lower_bound_index(n, p, confidence, two_sided=False):
+    """
+    Largest k (an index in n sorted samples, 0-based) such that the
+    order statistic x_(k) is below the p-quantile with a probability of at
+    least `confidence` (in %), i.e., P(X > k) >= confidence/100 for
+    X ~ B(n, p). With `two_sided` (median only, p = 0.5), such that the
+    median is between x_(k) and x_(n-1-k) with that probability.
+
+    Probabilities within 1e-9 (the accuracy of `binom_pmf`) of the
+    confidence level are considered to reach it: exact ties, e.g., 2
+    samples and 75% confidence for the median, are resolved as with exact
+    arithmetic.
+
+    Returns NaN if no order statistic qualifies.
+    """
+    if two_sided:
+        coverage = binom_sf(n, p) - binom_cdf(n, p)
+    else:
+        coverage = binom_sf(n, p)
+    nb_bounds = np.count_nonzero(coverage[:n] >= confidence/100 - 1e-9)
+    if nb_bounds == 0:
+        return np.nan
+    return nb_bounds - 1
+
 def min_number_samples(percentile,confidence,robustness=0):
 
     ##
@@ -208,11 +1343,8 @@ def min_number_samples(percentile,confidence,robustness=0):
 
         # Increse N until the desired confidence is reached
         while True:
-            # compute P( x_(1+r) <= Pp )
-            bd = scipy.stats.binom(N_single,percentile/100)
-            prob = 1-np.cumsum([bd.pmf(k) for k in range(robustness+1)])[-1]
-            # test
-            if prob >= (confidence/100):
+            # test P( x_(1+r) <= Pp ) >= confidence
+            if lower_bound_index(N_single, percentile/100, confidence) >= robustness:
                 break
             else:
                 N_single += 1
@@ -233,11 +1365,8 @@ def min_number_samples(percentile,confidence,robustness=0):
 
             # Increse N until the desired confidence is reached
             while True:
-                # compute P( x_(1+r) <= M <= x_(N-r) )
-                bd = scipy.stats.binom(N_double,percentile/100)
-                prob = 1-np.cumsum([2*bd.pmf(k) for k in range(robustness+1)])[-1]
-                # test
-                if prob >= (confidence/100):
+                # test P( x_(1+r) <= M <= x_(N-r) ) >= confidence
+                if lower_bound_index(N_double, 0.5, confidence, two_sided=True) >= robustness:
                     break
                 else:
                     N_double += 1
@@ -291,38 +1420,13 @@ def ThompsonCI( n_samples, percentile, confidence, CI_class=None, verbose=False)
         # 1. Compute the lower-bound of P_p
 
         p_work = percentile
-        # compute all probabilities from the binomiale distribution for the percentile of interest
-        bd=scipy.stats.binom(n_samples,p_work/100)
-        ppm = [np.maximum(1-x,0.0) for x in np.cumsum([bd.pmf(k) for k in range(n_samples)])]
-
         # search the index defining a lower-bound for p_work
-        if ppm[0] < confidence/100:
-            LB=np.nan
-        else:
-            for k in range(n_samples):
-                # search for first index reaching below the desired confidence
-                if ppm[k] < confidence/100:
-                    # lower-bound is the previous index
-                    LB = k-1
-                    break
+        LB = lower_bound_index(n_samples, p_work/100, confidence)
 
         # 2. Compute the lower-bound of P_(1-p)
 
         p_work = 100 - percentile
-        # compute all probabilities from the binomiale distribution for the percentile of interest
-        bd=scipy.stats.binom(n_samples,p_work/100)
-        ppm = [np.maximum(1-x,0.0) for x in np.cumsum([bd.pmf(k) for k in range(n_samples)])]
-
-        # search the index defining a lower-bound for p_work
-        if ppm[0] < confidence/100:
-            tmp=np.nan
-        else:
-            for k in range(n_samples):
-                # search for first index reaching below the desired confidence
-                if ppm[k] < confidence/100:
-                    # lower-bound is the previous index
-                    tmp = k-1
-                    break
+        tmp = lower_bound_index(n_samples, p_work/100, confidence)
 
         # 3. Deduce the upper-bound of P_p
 
@@ -338,20 +1442,8 @@ def ThompsonCI( n_samples, percentile, confidence, CI_class=None, verbose=False)
         ## Median
 
         if percentile == 50:
-            # compute all probabilities from the binomiale distribution for the percentile of interest
-            bd=scipy.stats.binom(n_samples,0.5)
-            ppm = [np.maximum(1-x,0.0) for x in np.cumsum([2*bd.pmf(k) for k in range(n_samples)])]
-
             # search the index defining a lower-bound for the median (two-sided)
-            if ppm[0] < confidence/100:
-                LB=np.nan
-            else:
-                for k in range(n_samples):
-                    # search for first index reaching below the desired confidence
-                    if ppm[k] < confidence/100:
-                        # lower-bound is the previous index
-                        LB = k-1
-                        break
+            LB = lower_bound_index(n_samples, 0.5, confidence, two_sided=True)
 
             # deduce the UB
             UB = ((n_samples-1) - LB) # /!\ First index is 0 (not 1)
@@ -369,20 +1461,8 @@ def ThompsonCI( n_samples, percentile, confidence, CI_class=None, verbose=False)
         # 1. Compute lower-bound on P_low
 
         p_work = p_low
-        # compute all probabilities from the binomiale distribution for the percentile of interest
-        bd=scipy.stats.binom(n_samples,p_work/100)
-        ppm = [np.maximum(1-x,0.0) for x in np.cumsum([bd.pmf(k) for k in range(n_samples)])]
-
         # search the index defining a lower-bound for p_work
-        if ppm[0] < confidence/100:
-            LB=np.nan
-        else:
-            for k in range(n_samples):
-                # search for first index reaching below the desired confidence
-                if ppm[k] < confidence/100:
-                    # lower-bound is the previous index
-                    LB = k-1
-                    break
+        LB = lower_bound_index(n_samples, p_work/100, confidence)
 
         # 2. Deduce the upper-bound of P_high
 
@@ -433,23 +1513,10 @@ def ThompsonCI_onesided( n_samples, percentile, confidence, CI_side='lower', ver
     else:
         p_work = percentile
 
-    # compute all probabilities from the binomiale distribution for the percentile of interest
-    bd=scipy.stats.binom(n_samples,p_work/100)
-    ppm = [np.maximum(1-x,0.0) for x in np.cumsum([bd.pmf(k) for k in range(n_samples)])]
-    # print([bd.pmf(k) for k in range(n_samples+1)])
-    # print([(1-bd.cdf(k)) for k in range(n_samples+1)])
-    # print(ppm)
-
     # search the index defining a lower-bound for p_work
-    if ppm[0] < confidence/100:
+    CI = lower_bound_index(n_samples, p_work/100, confidence)
+    if np.isnan(CI):
         return np.nan
-    else:
-        for k in range(n_samples):
-            # search for first index reaching below the desired confidence
-            if ppm[k] < confidence/100:
-                # lower-bound is the previous index
-                CI = k-1
-                break
 
     # return the requested CI index
     if CI_side == 'lower':
@@ -462,8 +1529,8 @@ def repeatability_test( data,
                         confidence_repeatability=95,
                         tolerance_repeatability=None):
 
-        # Make sure data is sorted
-        data.sort()
+        # Make sure data is sorted (without sorting the caller's array)
+        data = np.sort(data)
 
         # get the index ranges
         N = len(data)
@@ -471,17 +1538,9 @@ def repeatability_test( data,
         firstel = range(Nmax)
         lastel = [N-1-k for k in firstel]
 
-        # compute all probabilities from the binomiale distribution for the median
-        bd=scipy.stats.binom(N,0.5)
-        ppm = [np.maximum(1-x,0.0) for x in np.cumsum([2*bd.pmf(k) for k in firstel])]
-
-        # check the probabilities against the confidence level desired
-        serie_bound = None
-        for k in reversed(range(Nmax)):
-            if ppm[k]>=confidence_repeatability/100:
-                serie_bound = [ firstel[k]+1, lastel[k]+1, data[firstel[k]], data[lastel[k]] ]
-                break
-        if serie_bound is None:
+        # largest (two-sided) CI of the median with the confidence level desired
+        k = lower_bound_index(N, 0.5, confidence_repeatability, two_sided=True)
+        if np.isnan(k):
             print('You do not have enough data to report a %.0f%s confidence interval. Repeatability cannot be assessed with that level of confidence.' % (confidence_repeatability,'%'))
             return
 
@@ -498,3 +1557,860 @@ def repeatability_test( data,
         else:
 #             print('not repeatable')
             return False
+
+class SortedSample:
+    """
+    Metric data of a series of runs, prepared once for TriScale's analyses.
+
+    The NaN values are removed and the data is sorted at construction. The
+    outcomes of the stationarity tests (per `bounds`) and the indices of
+    the Thompson CIs (per percentile, confidence and CI class) are computed
+    on first use and cached. The object can be passed instead of the data
+    to `analysis_kpi`, `analysis_variability` and `ThompsonCI_plot`, so
+    that several KPIs and scores computed on the same sample share these
+    computations.
+
+    Parameters
+    ----------
+    data : 1-d np.array or list
+        The metric data for a series of run.
+
+    Attributes
+    ----------
+    data : 1-d np.array
+        The data, in the order of the runs, without NaN values.
+    sorted : 1-d np.array
+        The data, sorted in increasing order.
+    """
+
+    def __init__(self, data):
+        data = np.asarray(data, dtype=float)
+        self.data = data[~np.isnan(data)]
+        self.sorted = np.sort(self.data)
+        self._independent = None
+        self._weak_stationarity = {}
+        self._CI = {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, k):
+        """Order statistic of rank `k` (0 is the minimum)."""
+        return self.sorted[k]
+
+    @property
+    def constant(self):
+        """True if all data points have the same value."""
+        return len(self.sorted) > 0 and self.sorted[0] == self.sorted[-1]
+
+    def CI(self, percentile, confidence, CI_class='one-sided', verbose=False):
+        """
+        Indices (in the sorted data) of the bounds of the Thompson CI for
+        `percentile`, as returned by `ThompsonCI`.
+        """
+        key = (percentile, confidence, CI_class)
+        if key not in self._CI:
+            self._CI[key] = ThompsonCI(len(self.data),
+                                       percentile,
+                                       confidence,
+                                       CI_class,
+                                       verbose)
+        return self._CI[key]
+
+    def stationarity(self, bounds=None):
+        """
+        TriScale's stationarity tests (weak stationarity and independence)
+        on the data, in the order of the runs.
+
+        When `bounds` is None, the data is normalized based on its min-max
+        values for the weak stationarity test.
+
+        Returns the outcome of the independence test and the output of the
+        weak stationarity test (outcome, trend and tolerance data).
+        """
+        if self._independent is None:
+            self._independent = independence_test(self.data)
+        if bounds is None:
+            bounds = [self.sorted[0], self.sorted[-1]]
+        key = tuple(bounds)
+        if key not in self._weak_stationarity:
+            self._weak_stationarity[key] = convergence_test(np.arange(len(self.data)),
+                                                            self.data,
+                                                            list(bounds),
+                                                            50,
+                                                            10)
+        return self._independent, self._weak_stationarity[key]
+
+def content_hash(data):
+    """
+    Fast content hash (blake2b) of the input data of a TriScale analysis:
+    a file name (the file content is hashed), a DataFrame (its columns),
+    a tuple of array-likes, a `TraceIndex` (its samples), or an array-like.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    def update(values):
+        values = as_array(values)
+        if values.dtype == object:
+            # Hash the elements, not the pointers
+            values = pd.util.hash_array(values)
+        digest.update(str(values.dtype).encode())
+        digest.update(np.ascontiguousarray(values).data)
+
+    if isinstance(data, str):
+        with open_data(data) as input_file:
+            for block in iter(lambda: input_file.read(2**20), b''):
+                digest.update(block)
+    elif isinstance(data, pd.DataFrame):
+        for column in data.columns:
+            digest.update(str(column).encode())
+            update(data[column].values)
+        if isinstance(data.index, pd.DatetimeIndex):
+            update(data.index.values)
+    elif isinstance(data, tuple):
+        for values in data:
+            update(values)
+    elif isinstance(data, TraceIndex):
+        update(data.x)
+        update(data.y)
+    else:
+        update(data)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    On-disk cache of analysis results, bounded in size with LRU eviction.
+
+    Each result is pickled in its own file, named after its key, in
+    `directory`. Reading a result refreshes its modification time; when
+    the total size of the cache exceeds `max_bytes`, the least recently
+    used results are deleted. Results are written atomically, so several
+    threads or processes can share the same cache directory.
+
+    The total size is counted once, when the cache is opened, then kept
+    up to date by `put`: the directory is only scanned again when a result
+    pushes the total over `max_bytes`, and the eviction then frees 10% of
+    `max_bytes`, so that a full cache is not rescanned at every `put`.
+    Results written by other processes are only counted at the next scan.
+
+    Parameters
+    ----------
+    directory : string
+        Directory of the cache (created if needed).
+    max_bytes : integer, optional
+        Maximal total size of the cached results, in bytes.
+        Default : 1 GB
+    """
+
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.evict()
+
+    @staticmethod
+    def key(*parts):
+        """Key of a result, from the repr of its (normalized) parameters."""
+        return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        """Returns (True, result) if `key` is cached, (False, None) otherwise."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as result_file:
+                result = pickle.load(result_file)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        return True, result
+
+    def put(self, key, result):
+        """Store `result` under `key`, then evict results if needed."""
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as result_file:
+                pickle.dump(result, result_file, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(temp_path)
+            path = self._path(key)
+            try:
+                # Replaced result
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._total_bytes += size
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict(0.9 * self.max_bytes)
+
+    def evict(self, max_bytes=None):
+        """
+        Delete the least recently used results until the cache fits in
+        `max_bytes` (default: the `max_bytes` of the cache).
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Deleted meanwhile
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        with self._lock:
+            self._total_bytes = total
+
+def _parse_chunk(content, start, stop, dates, dtype=None):
+    """Parse the lines content[start:stop] of a two-column csv file."""
+    df = pd.read_csv(io.BytesIO(content[start:stop]),
+                     header=None,
+                     usecols=[0,1],
+                     dtype=None if dtype is None else {1: dtype})
+    x = df[0].values
+    y = df[1].values
+    if y.dtype.kind not in 'fiu':
+        raise ValueError("Non-numeric values")
+    if dates:
+        x = pd.to_datetime(df[0], utc=True).values
+    elif x.dtype.kind not in 'fiu':
+        raise ValueError("Non-numeric values")
+    return x, y
+
+def _parse_two_columns(content, dates, jobs, chunk_size, dtype=None):
+    """
+    Fast path of `read_two_columns`: parse the lines of `content` (after
+    the header line) by chunks of about `chunk_size` bytes, in parallel,
+    into preallocated arrays (y values of type `dtype`, float64 if None). Raise ValueError if the content does not fit
+    (e.g., non-numeric values or quoted fields).
+    """
+    if b'"' in content:
+        raise ValueError("Quoted fields")
+    body = content.find(b'\n') + 1
+    if body == 0 or body == len(content):
+        raise ValueError("No data line")
+
+    # Chunks start at line boundaries
+    starts = [body]
+    while starts[-1] + chunk_size < len(content):
+        next_line = content.find(b'\n', starts[-1] + chunk_size) + 1
+        if next_line == 0 or next_line == len(content):
+            break
+        starts.append(next_line)
+    stops = starts[1:] + [len(content)]
+
+    if jobs is None:
+        jobs = min(len(starts), os.cpu_count() or 1)
+    if jobs > 1:
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            chunks = list(executor.map(_parse_chunk,
+                                       [content]*len(starts), starts, stops,
+                                       [dates]*len(starts), [dtype]*len(starts)))
+    else:
+        chunks = [_parse_chunk(content, start, stop, dates, dtype)
+                  for start, stop in zip(starts, stops)]
+
+    # Copy the chunks in the preallocated outputs
+    n_rows = sum(len(chunk_y) for _, chunk_y in chunks)
+    if dates:
+        x_dtype = 'datetime64[ns]'
+    elif dtype is not None and all(chunk_x.dtype.kind in 'iu' for chunk_x, _ in chunks):
+        # Integer time stamps are kept exact
+        x_dtype = np.int64
+    else:
+        x_dtype = np.float64
+    x = np.empty(n_rows, dtype=x_dtype)
+    y = np.empty(n_rows, dtype=np.float64 if dtype is None else dtype)
+    row = 0
+    for chunk_x, chunk_y in chunks:
+        x[row:row+len(chunk_y)] = chunk_x
+        y[row:row+len(chunk_y)] = chunk_y
+        row += len(chunk_y)
+    return x, y
+
+def read_two_columns(file_name, dates=False, jobs=None, chunk_size=2**24, dtype=None):
+    """
+    Read the first two columns of a csv file (comma separated, with a
+    header line; see `open_data` for archives and compressed files), as
+    expected by `analysis_metric` and `network_profiling`.
+
+    Numeric traces (and, with `dates`, traces with date-times in the first
+    column) take a fast path: the file is split in chunks of about
+    `chunk_size` bytes at line boundaries, which are parsed in parallel by
+    `jobs` threads (the pandas C parser releases the GIL; default to one
+    thread per core) into preallocated float64 (or datetime64, in UTC)
+    arrays. Other files are parsed by `pd.read_csv` as a whole. The header
+    line and the missing values are handled identically.
+
+    With a `dtype` (e.g., np.float32), the y values are parsed to that
+    type; the x values are then kept as int64 when they are integers
+    (float64 otherwise), so time stamps do not lose precision.
+
+    Returns a tuple of arrays.
+    """
+    with open_data(file_name) as input_file:
+        content = input_file.read()
+    try:
+        return _parse_two_columns(content, dates, jobs, chunk_size, dtype)
+    except (ValueError, TypeError):
+        pass
+    df = pd.read_csv(io.BytesIO(content),
+                     delimiter=',',
+                     header=0,
+                     usecols=[0,1])
+    if dtype is not None:
+        return df.iloc[:,0].values, df.iloc[:,1].values.astype(dtype)
+    return df.iloc[:,0].values, df.iloc[:,1].values
+
+class PrefetchLoader:
+    """
+    Iterate over data files, read and parsed ahead by background threads.
+
+    While the caller analyzes one file, `jobs` threads read and parse the
+    next ones. At most `depth` files are read ahead (being read or waiting
+    to be analyzed), which caps the memory used by the loader.
+
+    The loader accounts for the time the caller waits for the data
+    ('io_wait') and the time the caller spends between two files
+    ('compute'): when 'io_wait' is significant, increasing `depth` and/or
+    `jobs` should help; when it is close to zero, the analysis is compute
+    bound.
+
+    Parameters
+    ----------
+    files : iterable
+        The data files (typically, file names).
+    depth : integer, optional
+        Maximal number of files read ahead.
+        Default : 4
+    jobs : integer, optional
+        Number of threads reading the files.
+        Default : 2
+    parser : callable or None, optional
+        Function reading one file. When None, `read_two_columns` is used,
+        which returns a tuple (x, y) accepted by `analysis_metric` and
+        `network_profiling`.
+        Default : None
+
+    Yields
+    ------
+    (file, data) : the file and the output of `parser` for that file,
+    in the order of `files`. Errors raised by `parser` are raised when the
+    corresponding file is reached.
+    """
+
+    def __init__(self, files, depth=4, jobs=2, parser=None):
+        if depth < 1 or jobs < 1:
+            raise ValueError("Invalid depth or jobs: provide positive integers.")
+        self.files = files
+        self.depth = depth
+        self.jobs = jobs
+        self.parser = read_two_columns if parser is None else parser
+        self.timing = {'files': 0, 'io_wait': 0., 'compute': 0., 'read': 0.}
+        self._lock = threading.Lock()
+
+    def _read(self, file):
+        start = time.perf_counter()
+        try:
+            return self.parser(file)
+        finally:
+            with self._lock:
+                self.timing['read'] += time.perf_counter() - start
+
+    def __iter__(self):
+        files = iter(self.files)
+        pending = collections.deque()
+        executor = concurrent.futures.ThreadPoolExecutor(self.jobs)
+        try:
+            # Fill the read-ahead queue
+            for file in files:
+                pending.append((file, executor.submit(self._read, file)))
+                if len(pending) == self.depth:
+                    break
+            while pending:
+                file, future = pending.popleft()
+                start = time.perf_counter()
+                data = future.result()
+                self.timing['io_wait'] += time.perf_counter() - start
+                # One file out, one file in (backpressure)
+                for next_file in files:
+                    pending.append((next_file, executor.submit(self._read, next_file)))
+                    break
+                self.timing['files'] += 1
+                start = time.perf_counter()
+                yield file, data
+                self.timing['compute'] += time.perf_counter() - start
+                del data
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def report(self):
+        """Textual summary of the time spent waiting for data and computing."""
+        output = ''
+        output += 'Files \t\t%i\n' % self.timing['files']
+        output += 'I/O wait \t%.3f s\n' % self.timing['io_wait']
+        output += 'Compute \t%.3f s\n' % self.timing['compute']
+        output += 'Read (threads) \t%.3f s\n' % self.timing['read']
+        return output
+
+SharedArray = collections.namedtuple('SharedArray', ['name', 'shape', 'dtype'])
+SharedArray.__doc__ = """Descriptor of a NumPy array in a shared memory block."""
+
+# Shared memory blocks attached by the current (worker) process: block
+# name -> (block, views), the most recently used last
+_attached_blocks = collections.OrderedDict()
+_attached_blocks_size = 16
+
+def _shared_view(block, descriptor, views):
+    # `np.frombuffer` wraps the buffer of the block in its own memoryview,
+    # which lives as long as the view (and the arrays derived from it): a
+    # weak reference to it is added to `views` (see `_close_shared_block`)
+    count = int(np.prod(descriptor.shape))
+    view = np.frombuffer(block.buf, dtype=descriptor.dtype, count=count)
+    views[:] = [reference for reference in views if reference() is not None]
+    views.append(weakref.ref(view.base))
+    return view.reshape(descriptor.shape)
+
+def _close_shared_block(block, views):
+    """
+    Close (unmap) a shared memory block, or, if some of its `views` are
+    still in use, as soon as they are all garbage collected.
+    """
+    try:
+        block.close()
+    except BufferError:
+        for reference in views:
+            buffer = reference()
+            if buffer is not None:
+                # Not called at exit: the views are only collected later
+                weakref.finalize(buffer, _close_shared_block, block, []).atexit = False
+
+class SharedArrayPool:
+    """
+    Process pool exchanging NumPy arrays through shared memory.
+
+    `share` copies an array into a shared memory block and `empty`
+    allocates a shared (output) array; both return a `SharedArray`
+    descriptor, which is all the workers receive. In the workers,
+    `SharedArrayPool.attach` maps the descriptor back to a NumPy array,
+    without copy; the parent accesses the same memory with `view`. Large
+    inputs and outputs are thus never pickled.
+
+    The pool owns the blocks: they are released when the pool is closed
+    (on exit of a `with` block, also when a worker crashed or an exception
+    was raised), or when the pool is garbage collected. Should the parent
+    process itself die, the multiprocessing resource tracker unlinks the
+    remaining blocks. Views still in use when the pool is closed remain
+    valid: their block is unmapped once they are all deleted. In the
+    workers, the most recently used blocks stay attached for the next
+    tasks; older blocks are detached.
+
+    Parameters
+    ----------
+    jobs : integer or None, optional
+        Number of worker processes (one per core when None).
+        Default : None
+    """
+
+    def __init__(self, jobs=None):
+        self._executor = concurrent.futures.ProcessPoolExecutor(jobs)
+        self._blocks = {}
+        self._views = {}
+        self._finalizer = weakref.finalize(self, SharedArrayPool._release, self._blocks, self._views)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def empty(self, shape, dtype=np.float64):
+        """Allocate an (uninitialized) shared array; returns its descriptor."""
+        shape = tuple(int(size) for size in np.atleast_1d(shape))
+        dtype = np.dtype(dtype)
+        if dtype.hasobject:
+            raise ValueError("Object arrays cannot be shared.")
+        nbytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+        block = multiprocessing.shared_memory.SharedMemory(create=True, size=nbytes)
+        self._blocks[block.name] = block
+        self._views[block.name] = []
+        return SharedArray(block.name, shape, dtype.str)
+
+    def share(self, array):
+        """Copy `array` into a shared memory block; returns its descriptor."""
+        array = as_array(array)
+        descriptor = self.empty(array.shape, array.dtype)
+        self.view(descriptor)[...] = array
+        return descriptor
+
+    def view(self, descriptor):
+        """NumPy view of a shared array of the pool, in the parent process."""
+        return _shared_view(self._blocks[descriptor.name], descriptor, self._views[descriptor.name])
+
+    @staticmethod
+    def attach(descriptor):
+        """
+        NumPy view of a shared array, in a worker process. The block stays
+        attached while it is among the `_attached_blocks_size` most
+        recently used ones, so that the tasks of a worker using the same
+        arrays attach them only once; older blocks are detached.
+        """
+        if descriptor.name in _attached_blocks:
+            _attached_blocks.move_to_end(descriptor.name)
+        else:
+            block = multiprocessing.shared_memory.SharedMemory(name=descriptor.name)
+            _attached_blocks[descriptor.name] = (block, [])
+            while len(_attached_blocks) > _attached_blocks_size:
+                _close_shared_block(*_attached_blocks.popitem(last=False)[1])
+        block, views = _attached_blocks[descriptor.name]
+        return _shared_view(block, descriptor, views)
+
+    def map(self, function, *iterables, chunksize=1):
+        """Map `function` over the tasks in the worker processes (as `Executor.map`)."""
+        return self._executor.map(function, *iterables, chunksize=chunksize)
+
+    def close(self):
+        """Shut the workers down and release the shared memory blocks."""
+        try:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        finally:
+            self._finalizer()
+
+    @staticmethod
+    def _release(blocks, views):
+        for name, block in blocks.items():
+            block.unlink()
+            _close_shared_block(block, views[name])
+        blocks.clear()
+        views.clear()
+
+def _downsample_sketches(values, weights, sketch_size):
+    """
+    Downsample weighted sketches (one per row) to `sketch_size` values at
+    evenly spaced cumulative weights, as `merge_stream_blocks`. Unused
+    sketch entries have a NaN value and a zero weight.
+    """
+    order = np.argsort(values, axis=1, kind='mergesort')
+    values = np.take_along_axis(values, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+    cum_weights = np.cumsum(weights, axis=1)
+    totals = cum_weights[:,-1]
+    # Each value stands for the weight centered on it
+    centers = cum_weights - weights/2
+    targets = totals[:,None] * (np.arange(sketch_size) + 0.5) / sketch_size
+    ranks = (centers[:,:,None] < targets[:,None,:]).sum(axis=1)
+    ranks = np.minimum(ranks, values.shape[1]-1)
+    values = np.take_along_axis(values, ranks, axis=1)
+    weights = np.repeat(totals[:,None] / sketch_size, sketch_size, axis=1)
+    values[totals == 0] = np.nan
+    return values, weights
+
+class TraceIndex:
+    """
+    Multi-resolution summary of a trace (x, y), to compute window measures
+    without rescanning the samples.
+
+    The valid samples (see `valid_samples`) are split in blocks of
+    `block_size` consecutive samples, each summarized by its count, sum,
+    min, max and a sketch of (at most) `sketch_size` weighted order
+    statistics (as `stream_block`). Coarser levels summarize `fanout`
+    consecutive blocks of the level below, until one block covers the
+    whole trace.
+
+    A window is decomposed into full blocks (at most 2*(fanout-1) per
+    level) and the partial blocks at its ends, whose samples are read from
+    `x` and `y` (memory-mapped when the index is loaded from disk). Mean,
+    minimum and maximum are thus exact, and cost O(block_size + fanout*log(n))
+    per window whatever its length. Percentiles are approximated from the
+    sketches of the full blocks and the samples of the partial blocks
+    (rank error of about 1% with the default sketch size); they are exact
+    for windows not containing any full block.
+
+    Parameters
+    ----------
+    x, y : 1-d array-likes
+        The trace.
+    block_size : integer, optional
+        Number of samples per base block.
+        Default : 256
+    sketch_size : integer, optional
+        Number of values in the sketch of each block.
+        Default : 64
+    fanout : integer, optional
+        Number of blocks merged in each block of the next level.
+        Default : 4
+
+    Attributes
+    ----------
+    x, y : 1-d np.array
+        The valid samples of the trace. Float y values keep their type
+        (e.g., float32), the block sums are accumulated in float64.
+    min, max : float
+        The minimal and maximal y values.
+    """
+
+    _fields = ('count', 'sum', 'min', 'max', 'values', 'weights')
+
+    def __init__(self, x, y, block_size=256, sketch_size=64, fanout=4):
+        if block_size < 1 or sketch_size < 2 or fanout < 2:
+            raise ValueError("Invalid index parameters: block_size >= 1, sketch_size >= 2 and fanout >= 2 required.")
+        self.block_size = block_size
+        self.sketch_size = sketch_size
+        self.fanout = fanout
+        if x is None:
+            # Filled by `load`
+            return
+        x, y = valid_samples(as_array(x), as_array(y))
+        self.x = x
+        self.y = np.asarray(y)
+        if self.y.dtype.kind != 'f':
+            self.y = self.y.astype(float)
+        if len(self.y) == 0:
+            raise ValueError("No valid samples in the trace.")
+        self.levels = [self._base_level()]
+        while len(self.levels[-1]['count']) > 1:
+            self.levels.append(self._merge_level(self.levels[-1]))
+        self.min = self.levels[-1]['min'][0]
+        self.max = self.levels[-1]['max'][0]
+
+    def __len__(self):
+        return len(self.y)
+
+    def _base_level(self):
+        n, size = len(self.y), self.block_size
+        nb_blocks = -(-n // size)
+        blocks = np.full(nb_blocks*size, np.nan, dtype=self.y.dtype)
+        blocks[:n] = self.y
+        blocks = np.sort(blocks.reshape(nb_blocks, size), axis=1)
+        count = np.full(nb_blocks, size)
+        count[-1] = n - (nb_blocks-1)*size
+        rows = np.arange(nb_blocks)
+
+        # Order statistics at the center of evenly spaced rank intervals
+        # (all samples for small blocks)
+        columns = np.arange(self.sketch_size)
+        ranks = ((columns + 0.5) * count[:,None] / self.sketch_size).astype(int)
+        ranks = np.where(count[:,None] > self.sketch_size, ranks, columns)
+        ranks = np.minimum(ranks, size-1)
+        values = np.take_along_axis(blocks, ranks, axis=1)
+        weights = np.where(count[:,None] > self.sketch_size,
+                           count[:,None] / self.sketch_size,
+                           (columns < count[:,None]).astype(float))
+        values[weights == 0] = np.nan
+
+        return {'count': count,
+                'sum': np.nansum(blocks, axis=1, dtype=np.float64),
+                'min': blocks[:,0],
+                'max': blocks[rows, count-1],
+                'values': values,
+                'weights': weights}
+
+    def _merge_level(self, level):
+        fanout = self.fanout
+        nb_blocks = len(level['count'])
+        padding = -nb_blocks % fanout
+        pad = {'count': 0, 'sum': 0., 'min': np.inf, 'max': -np.inf,
+               'values': np.nan, 'weights': 0.}
+        padded = {}
+        for field in self._fields:
+            array = level[field]
+            shape = (padding,) + array.shape[1:]
+            padded[field] = np.concatenate((array, np.full(shape, pad[field], dtype=array.dtype)))
+        groups = (nb_blocks + padding) // fanout
+        values, weights = _downsample_sketches(padded['values'].reshape(groups, -1),
+                                               padded['weights'].reshape(groups, -1),
+                                               self.sketch_size)
+        return {'count': padded['count'].reshape(groups, fanout).sum(axis=1),
+                'sum': padded['sum'].reshape(groups, fanout).sum(axis=1),
+                'min': padded['min'].reshape(groups, fanout).min(axis=1),
+                'max': padded['max'].reshape(groups, fanout).max(axis=1),
+                'values': values,
+                'weights': weights}
+
+    def _cover(self, first, last):
+        """
+        Decompose the base blocks [first, last) into the fewest blocks of
+        the index levels; returns a list of (level, block) pairs.
+        """
+        pieces = []
+        for depth, level in enumerate(self.levels):
+            if first >= last:
+                break
+            if depth == len(self.levels)-1:
+                pieces.extend((depth, block) for block in range(first, last))
+                break
+            # Blocks not aligned on the next level are taken at this level
+            up_first = -(-first // self.fanout)
+            up_last = last // self.fanout
+            if up_first >= up_last:
+                pieces.extend((depth, block) for block in range(first, last))
+                break
+            pieces.extend((depth, block) for block in range(first, up_first*self.fanout))
+            pieces.extend((depth, block) for block in range(up_last*self.fanout, last))
+            first, last = up_first, up_last
+        return pieces
+
+    def window_measures(self, start, stop, measures):
+        """
+        Compute several measures ('mean', 'minimum', 'maximum' or
+        percentiles) over the samples start:stop of the trace.
+        """
+        size = self.block_size
+        first = -(-start // size)
+        last = stop // size
+        if first >= last:
+            return window_measures(np.asarray(self.y[start:stop]), measures)
+
+        partial = np.concatenate((self.y[start:first*size], self.y[last*size:stop]))
+        pieces = self._cover(first, last)
+        blocks = [{field: self.levels[depth][field][block] for field in self._fields}
+                  for depth, block in pieces]
+
+        output = []
+        for measure in measures:
+            if isinstance(measure, str):
+                if measure == 'mean':
+                    output.append((sum(block['sum'] for block in blocks) + partial.sum(dtype=np.float64))
+                                  / (sum(block['count'] for block in blocks) + partial.size))
+                elif measure == 'minimum':
+                    output.append(np.concatenate(([block['min'] for block in blocks], partial)).min())
+                elif measure == 'maximum':
+                    output.append(np.concatenate(([block['max'] for block in blocks], partial)).max())
+                else:
+                    raise ValueError('Unsupported measure')
+            else:
+                values = np.concatenate([partial] + [block['values'] for block in blocks])
+                weights = np.concatenate([np.ones(partial.size)] + [block['weights'] for block in blocks])
+                used = weights > 0
+                values, weights = values[used], weights[used]
+                order = np.argsort(values)
+                weights = weights[order]
+                centers = np.cumsum(weights) - weights/2
+                rank = np.searchsorted(centers, measure/100 * weights.sum())
+                output.append(values[order][min(rank, values.size-1)])
+        return output
+
+    def windows_measures(self, starts, stops, measure):
+        """
+        Compute `measure` over the windows starts[i]:stops[i] of the trace,
+        as `windows_measures` on the samples (see the class description for
+        the exactness of the measures).
+        """
+        if isinstance(measure, (list, tuple)):
+            measures = measure
+        else:
+            measures = [measure]
+
+        metric_y = np.full((len(starts), len(measures)), np.nan)
+        for i, (start_index, stop_index) in enumerate(zip(starts, stops)):
+            if stop_index > start_index:
+                metric_y[i] = self.window_measures(start_index, stop_index, measures)
+
+        metric_y = metric_y.T
+        if measures is not measure:
+            metric_y = metric_y[0]
+
+        return metric_y
+
+    def save(self, directory, source=None):
+        """
+        Save the index in `directory`: the summaries in 'summary.npz', the
+        samples in 'x.npy' and 'y.npy' (memory-mapped by `load`).
+        `source` is the (size, mtime_ns) of the indexed file, if any.
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = {'parameters': np.array([self.block_size, self.sketch_size, self.fanout]),
+                  'source': np.array(source if source is not None else [-1, -1])}
+        for depth, level in enumerate(self.levels):
+            for field in self._fields:
+                arrays['%i_%s' % (depth, field)] = level[field]
+        np.save(os.path.join(directory, 'x.npy'), self.x)
+        np.save(os.path.join(directory, 'y.npy'), self.y)
+        # Written last: a complete summary implies complete samples
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as summary_file:
+            np.savez(summary_file, **arrays)
+        os.replace(temp_path, os.path.join(directory, 'summary.npz'))
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load an index saved by `save`; returns the index and the (size,
+        mtime_ns) of the indexed file (-1 if unknown).
+        """
+        with np.load(os.path.join(directory, 'summary.npz')) as arrays:
+            block_size, sketch_size, fanout = (int(value) for value in arrays['parameters'])
+            index = cls(None, None, block_size, sketch_size, fanout)
+            index.levels = []
+            while '%i_count' % len(index.levels) in arrays:
+                depth = len(index.levels)
+                index.levels.append({field: arrays['%i_%s' % (depth, field)]
+                                     for field in cls._fields})
+            source = tuple(int(value) for value in arrays['source'])
+        index.x = np.load(os.path.join(directory, 'x.npy'), mmap_mode='r')
+        index.y = np.load(os.path.join(directory, 'y.npy'), mmap_mode='r')
+        index.min = index.levels[-1]['min'][0]
+        index.max = index.levels[-1]['max'][0]
+        return index, source
+
+def trace_index_path(file_name):
+    """
+    Directory of the index of the data file `file_name`, next to it
+    ('<file>.tridx'). For members of zip archives, the index is stored
+    next to the archive ('<archive>.tridx/<member>').
+    """
+    archive, member = split_archive_path(file_name)
+    if member is None:
+        return file_name + '.tridx'
+    return os.path.join(archive + '.tridx', *member.split('/'))
+
+def trace_index(file_name, rebuild=False, dtype=None, **kwargs):
+    """
+    Load the index of the data file `file_name` (see `trace_index_path`),
+    or build it (from `read_two_columns`, with y values of type `dtype`)
+    and save it when it does not exist, is outdated (the size or
+    modification time of the file has changed), or `rebuild` is True.
+    `kwargs` are passed to `TraceIndex`.
+    """
+    archive, _ = split_archive_path(file_name)
+    stat = os.stat(archive)
+    source = (stat.st_size, stat.st_mtime_ns)
+    directory = trace_index_path(file_name)
+    if not rebuild:
+        try:
+            index, indexed = TraceIndex.load(directory)
+        except (OSError, KeyError, ValueError):
+            pass
+        else:
+            parameters = {'block_size': index.block_size,
+                          'sketch_size': index.sketch_size,
+                          'fanout': index.fanout}
+            if (indexed == source
+                and index.y.dtype == np.dtype(np.float64 if dtype is None else dtype)
+                and all(parameters[key] == value for key, value in kwargs.items())):
+                return index
+    x, y = read_two_columns(file_name, dtype=dtype)
+    index = TraceIndex(x, y, **kwargs)
+    index.save(directory, source)
+    return index
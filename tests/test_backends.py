@@ -0,0 +1,125 @@
+"""
+The Numba kernels of `helpers` against the NumPy implementation (skipped
+when numba is not installed), and the selection of the backend.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import helpers
+from helpers import set_backend, get_backend, theilslopes_rows, windows_measures
+
+MEASURES = ['mean', 'minimum', 'maximum', 0, 5, 25, 50, 62.5, 99.9, 100]
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    yield
+    set_backend('auto')
+
+@pytest.fixture(params=['numpy', 'numba'])
+def backend(request):
+    if request.param == 'numba':
+        pytest.importorskip('numba')
+    set_backend(request.param)
+    return request.param
+
+def both_backends(function, *args):
+    pytest.importorskip('numba')
+    set_backend('numpy')
+    expected = function(*args)
+    set_backend('numba')
+    return function(*args), expected
+
+def series(rng, n, kind):
+    if kind == 'random':
+        return rng.normal(size=n)
+    # Many ties
+    return rng.integers(0, 4, size=n).astype(float)
+
+##
+# Theil-Sen regressions
+##
+
+@pytest.mark.parametrize('kind', ['random', 'ties'])
+def test_theilslopes_rows(kind):
+    rng = np.random.default_rng(0)
+    for n in [2, 3, 10, 57, 100]:
+        x = np.sort(series(rng, n, kind))
+        Y = np.stack([series(rng, n, kind) for _ in range(7)])
+        output, expected = both_backends(theilslopes_rows, Y, x, 0.95)
+        np.testing.assert_array_equal(output, expected)
+
+def test_theilslopes_rows_scipy(backend):
+    scipy_stats = pytest.importorskip('scipy.stats')
+    rng = np.random.default_rng(1)
+    for kind in ['random', 'ties']:
+        for n in [3, 10, 57]:
+            x = np.sort(series(rng, n, kind))
+            y = series(rng, n, kind)
+            np.testing.assert_array_equal(theilslopes_rows(y, x, 0.95)[0],
+                                          np.array(scipy_stats.theilslopes(y, x, 0.95)))
+
+def test_theilslopes_rows_degenerate(backend):
+    # Constant y with ties in x (sigsq < 0), or no slope at all (x
+    # constant): NaN bounds, as scipy.stats.theilslopes
+    output = theilslopes_rows(np.array([[1., 1, 1, 1], [1., 2, 3, 4]]),
+                              np.array([0., 0, 1, 1]), 0.95)
+    np.testing.assert_array_equal(output[0], [0., 1., np.nan, np.nan])
+    assert np.isfinite(output[1]).all()
+    with pytest.warns(RuntimeWarning):
+        output = theilslopes_rows(np.array([1., 2, 3]), np.array([1., 1, 1]), 0.95)
+    assert np.isnan(output).all()
+
+def test_analysis_metric_degenerate(backend):
+    import triscale
+    data = pd.DataFrame({'x': [0, 0, 0, 0, 1, 1, 1, 1],
+                         'y': [1, 1, 2, 2, 1, 1, 2, 2]})
+    has_converged, measure, _ = triscale.analysis_metric(data, {'measure': 'mean'}, {'expected': True})
+    assert has_converged
+    assert measure == 1.5
+
+##
+# Window measures
+##
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32, np.int64])
+@pytest.mark.parametrize('kind', ['random', 'ties'])
+def test_windows_measures(dtype, kind):
+    rng = np.random.default_rng(2)
+    samples = (100 * series(rng, 5000, kind)).astype(dtype)
+    starts = rng.integers(0, 5000, 200)
+    stops = starts + rng.integers(-5, 2000, 200)
+    output, expected = both_backends(windows_measures, samples, starts, stops, MEASURES)
+    # Same order statistics; the means only differ in summation order
+    np.testing.assert_array_equal(output[1:], expected[1:])
+    np.testing.assert_allclose(output[0], expected[0], rtol=1e-12)
+    assert np.isnan(output[:, stops <= starts]).all()
+
+def test_windows_measure_single(backend):
+    samples = np.arange(10.)
+    output = windows_measures(samples, [0, 5], [10, 10], 50)
+    np.testing.assert_array_equal(output, [4.5, 7.])
+    with pytest.raises(ValueError):
+        windows_measures(samples, [0], [10], 'median')
+
+##
+# Backend selection
+##
+
+def test_auto_backend(monkeypatch):
+    monkeypatch.setattr(helpers, 'numba_available', lambda: True)
+    for cores, expected in [(1, 'numpy'), (3, 'numpy'), (4, 'numba'), (64, 'numba')]:
+        monkeypatch.setattr(helpers, 'usable_cores', lambda: cores)
+        assert set_backend('auto') == expected
+    monkeypatch.setattr(helpers, 'numba_available', lambda: False)
+    assert set_backend('auto') == 'numpy'
+
+def test_set_backend(monkeypatch):
+    assert set_backend('numpy') == get_backend() == 'numpy'
+    with pytest.raises(ValueError):
+        set_backend('jax')
+    monkeypatch.setattr(helpers, 'numba_available', lambda: False)
+    with pytest.raises(ImportError):
+        set_backend('numba')
+    assert get_backend() == 'numpy'
@@ -0,0 +1,130 @@
+"""
+The log-space binomial kernel of `helpers` against `scipy.stats.binom`,
+and the CI and sizing functions built on it against their former
+implementation (scipy pmf, summed per k).
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+scipy_stats = pytest.importorskip('scipy.stats')
+
+from helpers import binom_pmf, binom_cdf, binom_sf, lower_bound_index
+from helpers import ThompsonCI, ThompsonCI_onesided, min_number_samples
+
+SIZES = [1, 2, 3, 5, 10, 31, 100, 333, 1000, 10000]
+PROBABILITIES = [0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999]
+PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+CONFIDENCES = [50, 75, 90, 95, 99]
+
+##
+# Former implementation
+##
+
+class Tie(Exception):
+    """The probability reaches the confidence level up to rounding: the former result was arbitrary."""
+
+def former_lower_bound_index(n, p, confidence, factor=1):
+    # As the former ThompsonCI: first k such that 1 - sum(factor*pmf[:k+1]) < confidence
+    ppm = np.maximum(1 - np.cumsum(factor * scipy_stats.binom(n, p).pmf(np.arange(n))), 0.)
+    if np.any(np.abs(ppm - confidence/100) < 1e-9):
+        raise Tie()
+    if ppm[0] < confidence/100:
+        return np.nan
+    below = np.nonzero(ppm < confidence/100)[0]
+    if below.size == 0:
+        # The former implementation failed (UnboundLocalError)
+        raise Tie()
+    return below[0] - 1
+
+def former_ThompsonCI(n, percentile, confidence, CI_class):
+    if CI_class == 'two-sided' and percentile == 50:
+        LB = former_lower_bound_index(n, 0.5, confidence, factor=2)
+        return LB, (n-1) - LB
+    if CI_class == 'two-sided':
+        LB = former_lower_bound_index(n, min(percentile, 100-percentile)/100, confidence)
+        return LB, (n-1) - LB
+    LB = former_lower_bound_index(n, percentile/100, confidence)
+    return LB, (n-1) - former_lower_bound_index(n, 1 - percentile/100, confidence)
+
+def former_min_number_samples(percentile, confidence, robustness):
+    N_single = math.ceil(math.log(1-confidence/100)/math.log(1-percentile/100))
+    if robustness:
+        N_single = max(N_single, 2*(robustness+1))
+        while scipy_stats.binom(N_single, percentile/100).sf(robustness) < confidence/100:
+            N_single += 1
+    if percentile != 50:
+        return N_single, N_single
+    N_double = math.ceil(1 - (math.log(1-confidence/100)/math.log(2)))
+    if robustness:
+        N_double = max(N_double, 2*(robustness+1))
+        while 1 - 2*scipy_stats.binom(N_double, 0.5).cdf(robustness) < confidence/100:
+            N_double += 1
+    return N_single, N_double
+
+def same(first, second):
+    return all((a == b) or (np.isnan(a) and np.isnan(b)) for a, b in zip(first, second))
+
+##
+# Tests
+##
+
+@pytest.mark.parametrize('n', SIZES)
+def test_distribution(n):
+    k = np.arange(n+1)
+    for p in PROBABILITIES:
+        distribution = scipy_stats.binom(n, p)
+        np.testing.assert_allclose(binom_pmf(n, p), distribution.pmf(k), rtol=1e-8, atol=1e-12)
+        np.testing.assert_allclose(binom_cdf(n, p), distribution.cdf(k), rtol=1e-8, atol=1e-10)
+        np.testing.assert_allclose(binom_sf(n, p), distribution.sf(k), rtol=1e-8, atol=1e-10)
+
+def test_distribution_edges():
+    assert list(binom_pmf(3, 0.)) == [1., 0., 0., 0.]
+    assert list(binom_pmf(3, 1.)) == [0., 0., 0., 1.]
+    assert np.isfinite(binom_pmf(100000, 0.5)).all()
+
+@pytest.mark.parametrize('n', SIZES)
+def test_lower_bound_index(n):
+    for p in PROBABILITIES:
+        for confidence in CONFIDENCES:
+            coverage = scipy_stats.binom(n, p).sf(np.arange(n))
+            nb_bounds = np.count_nonzero(coverage >= confidence/100 - 1e-9)
+            expected = nb_bounds - 1 if nb_bounds else np.nan
+            assert same([lower_bound_index(n, p, confidence)], [expected]), (n, p, confidence)
+
+@pytest.mark.parametrize('CI_class', ['one-sided', 'two-sided'])
+def test_ThompsonCI(CI_class):
+    compared = 0
+    for n in list(range(1, 80)) + [150, 333]:
+        for percentile in PERCENTILES:
+            for confidence in CONFIDENCES:
+                try:
+                    expected = former_ThompsonCI(n, percentile, confidence, CI_class)
+                except Tie:
+                    continue
+                assert same(ThompsonCI(n, percentile, confidence, CI_class), expected), \
+                    (n, percentile, confidence, CI_class)
+                compared += 1
+    assert compared > 3000
+
+def test_ThompsonCI_onesided():
+    for n in range(1, 80):
+        for percentile in PERCENTILES:
+            for confidence in CONFIDENCES:
+                try:
+                    LB, UB = former_ThompsonCI(n, percentile, confidence, 'one-sided')
+                except Tie:
+                    continue
+                for side, expected in [('lower', LB), ('upper', UB)]:
+                    assert same([ThompsonCI_onesided(n, percentile, confidence, CI_side=side)], [expected]), \
+                        (n, percentile, confidence, side)
+
+def test_min_number_samples():
+    for percentile in PERCENTILES:
+        for confidence in CONFIDENCES:
+            for robustness in range(4):
+                assert (min_number_samples(percentile, confidence, robustness)
+                        == former_min_number_samples(percentile, confidence, robustness)), \
+                    (percentile, confidence, robustness)
@@ -0,0 +1,47 @@
+"""
+On-disk result cache of `helpers`: size bound, running total, failed writes.
+"""
+
+import os
+import time
+
+import pytest
+
+from helpers import ResultCache
+
+def cache_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+def test_put_get(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.get(cache.key('missing')) == (False, None)
+    cache.put(cache.key('a', 1), [1, 2.5, 'x'])
+    assert cache.get(cache.key('a', 1)) == (True, [1, 2.5, 'x'])
+
+def test_size_bound(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=20000)
+    start = time.perf_counter()
+    for i in range(3000):
+        cache.put(cache.key(i), b'x' * 100)
+    # Without a rescan of the directory at every put
+    assert time.perf_counter() - start < 5
+    assert cache_size(tmp_path) <= 20000
+    assert cache.get(cache.key(2999))[0]
+    assert not cache.get(cache.key(0))[0]
+
+def test_running_total(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', b'x' * 1000)
+    cache.put('a', b'x' * 10)
+    cache.put('b', b'x' * 100)
+    assert cache._total_bytes == cache_size(tmp_path)
+    # Counted when the cache is opened
+    assert ResultCache(str(tmp_path))._total_bytes == cache_size(tmp_path)
+    ResultCache(str(tmp_path), max_bytes=10)
+    assert os.listdir(tmp_path) == []
+
+def test_failed_put(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    with pytest.raises(Exception):
+        cache.put('a', lambda: None)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,42 @@
+"""
+Command line of TriScale (`triscale_cli.py`): outputs and exit status.
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip('yaml')
+
+import triscale_cli
+
+SPEC = """
+KPI:
+  percentile: 50
+  confidence: 75
+  bounds: [0, 10]
+  bound: upper
+"""
+
+@pytest.fixture
+def spec(tmp_path):
+    path = tmp_path / 'spec.yml'
+    path.write_text(SPEC)
+    return str(path)
+
+def run(capsys, *argv):
+    status = triscale_cli.main(list(argv))
+    return status, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+def test_kpi(tmp_path, spec, capsys):
+    (tmp_path / 'metrics.csv').write_text('value\n' + '\n'.join(str(v % 7) for v in range(30)))
+    status, records = run(capsys, 'kpi', '--spec', spec, str(tmp_path / '*.csv'))
+    assert status == 0
+    assert [record['input'] for record in records] == [str(tmp_path / 'metrics.csv')]
+    assert 'KPI' in records[0]
+
+def test_unmatched_pattern(tmp_path, spec, capsys):
+    # A missing (or mistyped) input directory must not succeed silently
+    status, records = run(capsys, 'kpi', '--spec', spec, str(tmp_path / 'missing' / '*.csv'))
+    assert status == 1
+    assert len(records) == 1 and 'error' in records[0]
@@ -0,0 +1,37 @@
+"""
+Change point segmentation (PELT) of `helpers`: exactness, and run time on
+month-long stationary series.
+"""
+
+import time
+
+import numpy as np
+
+from helpers import changepoint_segmentation
+
+def test_steps():
+    rng = np.random.default_rng(0)
+    x = np.repeat(rng.normal(size=40)*5, 1000) + rng.normal(size=40000)
+    # Default stride of 9 samples: same change points as the exact search
+    np.testing.assert_array_equal(changepoint_segmentation(x),
+                                  changepoint_segmentation(x, stride=1))
+
+def test_stride():
+    rng = np.random.default_rng(1)
+    x = np.repeat([0., 2, 0, 5, 1], 1000) + rng.normal(size=5000)
+    x[rng.random(5000) < 0.1] = np.nan
+    expected = changepoint_segmentation(x, stride=1)
+    np.testing.assert_array_equal(expected, [0, 1000, 2000, 3000, 4000, 5000])
+    np.testing.assert_array_equal(changepoint_segmentation(x, stride=7), expected)
+
+def test_short_series():
+    np.testing.assert_array_equal(changepoint_segmentation(np.arange(5.)), [0, 5])
+
+def test_stationary_month():
+    # One sample every 10 s for a month, without change point
+    x = np.random.default_rng(2).normal(size=259200)
+    start = time.perf_counter()
+    bounds = changepoint_segmentation(x)
+    elapsed = time.perf_counter() - start
+    np.testing.assert_array_equal(bounds, [0, len(x)])
+    assert elapsed < 5, elapsed
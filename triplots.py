@@ -7,8 +7,9 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.io as pio
 pio.templates.default = "none"
+pio.renderers.default='notebook'
 
-from helpers import acorr
+from helpers import masked_autocorr, SortedSample
 import colors
 
 def autocorr_plot(  x,
@@ -26,6 +27,9 @@ def autocorr_plot(  x,
         +/- 1.96*sqrt( len(x) )
     If the sample autocorellation coefficients are within these bounds,
     the series is i.i.d. with 95% probability.
+
+    Missing samples (NaN) are ignored; the confidence interval then widens
+    for the lags with fewer valid pairs of samples.
     """
 
     todo = ''
@@ -39,13 +43,18 @@ def autocorr_plot(  x,
     if verbose:
         print('%s' % todo)
 
+    ## Compute the autocorrelation
+    autocorr, iid_bounds = masked_autocorr(x)
+    lags = np.arange(len(autocorr))
+    iid_bounds = np.where(np.isinf(iid_bounds), np.nan, iid_bounds)
+
     ## Initialize the figure
     figure = go.Figure()
 
     # IID bounds
     bounds = go.Scatter(
-        x=[0,len(x),len(x),0],
-        y= np.array([1,1,-1,-1])*(1.96)/np.sqrt(len(x)),
+        x=np.concatenate((lags, lags[::-1])),
+        y=np.concatenate((iid_bounds, -iid_bounds[::-1])),
         hoverinfo='skip',
         mode='lines',
         fill='toself',
@@ -57,8 +66,8 @@ def autocorr_plot(  x,
 
     # Autocorellation coefficients
     trace = go.Scatter(
-        x=list(range(0,len(x))),
-        y=acorr(x),
+        x=lags,
+        y=autocorr,
         mode='markers, lines',
         line={'color':colors.orange},
         marker={'color':colors.orange},
@@ -262,7 +271,11 @@ def ThompsonCI_plot(    data,
         raise ValueError("Wrong plot type. Valid types: 'vertical', 'horizontal'")
 
     # Make sure data is sorted
-    sorted_data = np.sort(data)
+    if isinstance(data, SortedSample):
+        sorted_data = data.sorted
+        data = data.data
+    else:
+        sorted_data = np.sort(data)
 
     # Initialize the CI shape
     interval_shape = {
@@ -2,31 +2,218 @@
 TriScale module
 
 Public API
+    profiling_ingestion
     network_profiling
     experiment_sizing
+    experiment_planning
     analysis_metric
+    analysis_metric_online
+    analysis_metric_parallel
     analysis_kpi
     analysis_variability
+    analysis_groups
+    analysis_kpi_pooled
+    analysis_report
+    SortedSample
+    PrefetchLoader
+    archive_members
+    TraceIndex
+    trace_index
+    SharedArrayPool
+    set_backend
+    get_backend
+
+The public functions treat their inputs as read-only: the data and the
+configuration dictionaries (metric, convergence, KPI, score) are never
+modified, so one configuration can be shared by concurrent calls (e.g.,
+from a ThreadPoolExecutor). The outputs are plain Python, NumPy, pandas
+and plotly objects, which can be pickled (e.g., to be returned from a
+process pool).
+
+The plotting libraries (plotly, `triplots`) are only imported when a plot
+is produced, so that the analyses (and `triscale_cli`) start without them.
+
+The Theil-Sen regressions and the window measures of the convergence test
+can run on optional Numba kernels, parallel across the CPU cores; see
+`set_backend`.
 """
 
+import concurrent.futures
+import os
+import time
+
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.io as pio
-pio.renderers.default='notebook'
 
 from helpers import convergence_test, ThompsonCI, ThompsonCI_onesided, independence_test, min_number_samples, repeatability_test
-from triplots import theil_plot, autocorr_plot, ThompsonCI_plot
+from helpers import seasonal_periods, window_independence, changepoint_segmentation
+from helpers import convergence_status, stream_block, merge_stream_blocks, stream_window_measure
+from helpers import sliding_window_measures, expanding_window_measures, convergence_test_rows
+from helpers import time_window_measures, convergence_windows, TraceIndex, trace_index
+from helpers import SharedArrayPool, set_backend, get_backend
+from helpers import masked_autocorr, as_array, valid_samples, SortedSample
+from helpers import pooled_order_statistic, content_hash, ResultCache, PrefetchLoader
+from helpers import read_csv_chunks, read_two_columns, archive_members
 
 # ----------------------------------------------------------------------------------------------------------------------------
 # NETWORK PROFILING
 # ----------------------------------------------------------------------------------------------------------------------------
 
+def profiling_ingestion(raw_data,
+                        granularity,
+                        aggregate='mean',
+                        time_unit=None,
+                        chunk_size=1000000,
+                        output_file_name=None,
+                        verbose=False):
+    """
+    Bin raw, irregularly spaced link probe records into an equally spaced
+    link quality time series, ready for `network_profiling`.
+
+    The raw records are read in chunks of `chunk_size` rows. Each chunk is
+    binned to `granularity` and aggregated with vectorized group-by
+    operations; the per-bin aggregates are merged across chunks. Memory
+    usage is therefore bounded by the chunk size and the number of bins,
+    regardless of the size of the raw log.
+
+    Parameters
+    ----------
+    raw_data : string or iterable of pandas DataFrame
+        The raw probe records: one time stamp, one link quality value.
+        - When a string is passed, `raw_data` is expected to be a name of a
+        csv file (comma separated, with a header line) with time stamps in
+        the first column and link quality values in the second column.
+        The file may be compressed ('.gz', '.bz2', '.xz', '.zst') or be a
+        member of a zip archive (e.g., 'campaign.zip/run_1.csv'); it is
+        decompressed while being read, without extraction.
+        - Otherwise, `raw_data` must yield DataFrames (e.g., chunks of a
+        larger log), with time stamps in the first column and link quality
+        values in the second column.
+    granularity : string or pandas Timedelta
+        Time span of one bin of the output series, e.g., '1h' or '10min'.
+    aggregate : 'mean', 'minimum' or 'maximum', optional
+        Measure used to aggregate the link quality values in each bin.
+        Default : 'mean'
+    time_unit : string or None, optional
+        When None, the time stamps are parsed as dates.
+        Otherwise, they are numeric time stamps since the epoch, in the
+        given unit (e.g., 's' or 'ms').
+        Default : None
+    chunk_size : integer, optional
+        Number of raw records read at once.
+        Default : 1000000
+    output_file_name : string or None, optional
+        When a string, the output series is saved under `output_file_name`
+        as a csv file, which can be passed directly to `network_profiling`.
+        Default : None
+    verbose : True/False, optional
+        When true, print non-functional and intermediary outputs.
+        Default : False
+
+    Returns
+    -------
+    link_quality_data : pandas DataFrame
+        Equally spaced link quality series, with a `date_time` index
+        and columns
+        - `link_quality` : the aggregated link quality value (NaN for bins
+        without any record);
+        - `samples` : the number of raw records in the bin.
+    """
+
+    ##
+    # Checking the inputs
+    ##
+    if aggregate not in ['mean', 'minimum', 'maximum']:
+        raise ValueError("Invalid aggregate: "+repr(aggregate)+". Valid 'aggregate' values: 'mean', 'minimum' or 'maximum'")
+    granularity = pd.Timedelta(granularity)
+
+    if isinstance(raw_data, str):
+        try:
+            chunks = read_csv_chunks(   raw_data,
+                                        chunk_size,
+                                        delimiter=',',
+                                        names=['date_time', 'link_quality'],
+                                        header=0,
+                                        usecols=[0,1], # consider only the first two columns
+                                        )
+        except FileNotFoundError:
+            print(repr(raw_data) + " not found")
+            return None
+    else:
+        chunks = raw_data
+
+    ##
+    # Binning and aggregation, chunk by chunk
+    ##
+    aggregation = { 'sum': 'sum',
+                    'samples': 'sum',
+                    'minimum': 'min',
+                    'maximum': 'max'}
+    bins = None
+    nb_records = 0
+    for chunk in chunks:
+        if time_unit is None:
+            times = pd.to_datetime(chunk.iloc[:,0], utc=True, errors='coerce')
+        else:
+            times = pd.to_datetime(chunk.iloc[:,0], unit=time_unit, utc=True, errors='coerce')
+        values = pd.to_numeric(chunk.iloc[:,1], errors='coerce')
+        nb_records += len(chunk.index)
+
+        chunk_bins = pd.DataFrame({ 'sum': values.values,
+                                    'samples': values.notna().values,
+                                    'minimum': values.values,
+                                    'maximum': values.values},
+                                  index=times.dt.floor(granularity).values)
+        chunk_bins = chunk_bins[chunk_bins.index.notna()]
+        chunk_bins = chunk_bins.groupby(level=0).agg(aggregation)
+
+        # Merge with the bins of the previous chunks
+        if bins is None:
+            bins = chunk_bins
+        else:
+            bins = pd.concat((bins, chunk_bins)).groupby(level=0).agg(aggregation)
+
+    if bins is None or bins.empty:
+        print("No valid record in " + repr(raw_data))
+        return None
+
+    ##
+    # Equally spaced output series
+    ##
+    if aggregate == 'mean':
+        link_quality = bins['sum'] / bins['samples'].where(bins['samples'] > 0)
+    else:
+        link_quality = bins[aggregate]
+    link_quality_data = pd.DataFrame({  'link_quality': link_quality,
+                                        'samples': bins['samples'].astype(int)})
+    full_range = pd.date_range( link_quality_data.index[0],
+                                link_quality_data.index[-1],
+                                freq=granularity)
+    link_quality_data = link_quality_data.reindex(full_range)
+    link_quality_data['samples'] = link_quality_data['samples'].fillna(0).astype(int)
+    link_quality_data.index.name = 'date_time'
+
+    if verbose:
+        print('%i records binned into %i bins of %s (%i empty)'
+              % ( nb_records,
+                  len(link_quality_data.index),
+                  granularity,
+                  (link_quality_data['samples'] == 0).sum()))
+
+    if output_file_name is not None:
+        link_quality_data.to_csv(output_file_name)
+
+    return link_quality_data
+
 def network_profiling(  link_quality_data,
                         link_quality_bounds,
                         name=None,
                         print_output=False,
-                        verbose=False):
+                        verbose=False,
+                        max_window=None,
+                        return_profile=False,
+                        plot=True,
+                        cache=None):
     """
     Perform the network profiling as suggested by TriScale [1].
 
@@ -48,13 +235,36 @@ def network_profiling(  link_quality_data,
     Overwise, the pics in the autocorellation plot identify the seasonal
     components in the link quality data.
 
+    When the link quality data does not appear i.i.d., the function
+    searches for the dominant seasonal periods in the periodogram of the
+    data (computed with the FFT). It then looks for the minimal window size
+    such that the link quality averaged over non-overlapping windows
+    appears i.i.d.; the corresponding time span is the minimal spacing
+    between experiments required to avoid the correlation.
+
+    When the link quality data is not stationary (i.e., either the
+    convergence or the independence test fails), the series is segmented
+    into pieces of constant mean using a change-point detection [4].
+    TriScale's convergence test is performed on each segment, which
+    identifies time spans that are stationary enough to schedule
+    experiments in.
+
     Parameters
     ----------
-    link_quality_data : pandas DataFrame
+    link_quality_data : string, pandas DataFrame or tuple of arrays
         Contains link quality data from the network where the experiment is
         expected to be performed.
-        - Must contain a `link_quality` column.
-        - Must contain a `data_time` column or having a DatetimeIndex.
+        - When a string is passed, name of a csv file with the date and time
+        in the first column and the link quality in the second column.
+        The file may be compressed ('.gz', '.bz2', '.xz', '.zst') or be a
+        member of a zip archive (e.g., 'campaign.zip/run_1.csv'); it is
+        decompressed while being read, without extraction.
+        - When a pandas DataFrame is passed, it must contain a `link_quality`
+        column and a `date_time` column or a DatetimeIndex.
+        - When a tuple `(date_time, link_quality)` is passed, both are
+        array-likes of the same length (NumPy arrays, memoryviews, Arrow
+        arrays, ...). They are used without copy whenever possible.
+        The input is not modified.
     link_quality_bounds : list-like of len 2.
         Expected extremal values for the link quality data,
         used for the convergence test.
@@ -68,6 +278,25 @@ def network_profiling(  link_quality_data,
     verbose : True/False, optional
         When true, print non-functional and intermediary outputs.
         Default : False
+    max_window : integer or None, optional
+        Largest window size (in number of samples) considered when searching
+        for a time span over which the link quality appears i.i.d.
+        When None, windows are searched such that at least 10 window
+        averages remain.
+        Default : None
+    return_profile : True/False, optional
+        When True, the profiling results are also returned as a dictionary.
+        Default : False
+    plot : True/False, optional
+        When False, the plots are not produced (and None is returned in
+        place of the figures).
+        Default : True
+    cache : string, ResultCache or None, optional
+        Directory of an on-disk cache (or a `ResultCache`) memoizing the
+        results, keyed by the content of `link_quality_data` and the other
+        parameters. Unchanged inputs return the cached results without
+        recomputation.
+        Default : None
 
     Returns
     -------
@@ -75,21 +304,39 @@ def network_profiling(  link_quality_data,
         The function produces and display the autocorellation plot of the
         link quality data. The figure is returned to the user (e.g., to modify
         the default layout).
+    profile : dictionary
+        Only returned when `return_profile` is True.
+        - "converged" : outcome of the convergence test
+        - "iid" : outcome of the independence test
+        - "granularity" : time span between two samples
+        - "seasonal_periods" : time spans of the dominant seasonal periods,
+        sorted by decreasing spectral power
+        - "window_sizes" : candidate window sizes (in number of samples)
+        - "window_iid" : outcome of the independence test for each window size
+        - "min_window" : minimal window size for which the link quality
+        appears i.i.d. (None if not found)
+        - "time_span" : time span corresponding to `min_window`
+        (None if not found)
+        - "segments" : list of segments of constant mean, each described as
+        a dictionary with "start" and "end" time stamps and "converged",
+        the outcome of the convergence test on that segment
+        (empty if the link quality data is stationary)
 
     Notes
     -----
     - Computing autocorrelation of a time series requires equally spaced values.
-    Missing values must be interpolated based on existing data to compute the
-    autocorrelation coefficients.
-    In this function, missing values are replaced by the median of all
-    collected values.
+    Missing values (NaN) are not interpolated: the autocorrelation
+    coefficients are estimated from the pairs of valid samples only, and the
+    confidence interval of the independence test accounts for the number of
+    such pairs for each lag.
     - The autocolleration plot shows the the 95th confidence interval for the
     autocorrelation coefficient values such that the data appears i.i.d.
     This confidence interval is computed as +/-1.95*sqrt(N),
     where N is the number of samples [2].
     - A textual output of network profiling analysis is triggered by the
-    `print_output` parameter. The current implementation is minimal (it only
-    says whether the link quality data appears to be i.i.d.).
+    `print_output` parameter. It says whether the link quality data appears
+    to be i.i.d. and, if not, reports the dominant seasonal periods and the
+    minimal time span over which the link quality appears i.i.d.
 
     References
     ----------
@@ -104,6 +351,9 @@ def network_profiling(  link_quality_data,
         Henri Theil’s Contributions to Economics and Econometrics: Econometric
         Theory and Methodology, Advanced Studies in Theoretical and Applied
         Econometrics, pages 345–381. Springer Netherlands, Dordrecht, 1992.
+    .. [4] R. Killick, P. Fearnhead, and I. A. Eckley, "Optimal Detection of
+        Changepoints With a Linear Computational Cost", Journal of the
+        American Statistical Association, 107(500):1590-1598, 2012.
     """
 
     todo = ''
@@ -133,48 +383,79 @@ def network_profiling(  link_quality_data,
     # profiling_output += '\nNetwork \t%s\n' % (network_name)
 
 
+    # Cached results
+    cache_key = None
+    if cache is not None:
+        if not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+        try:
+            cache_key = cache.key('network_profiling',
+                                  content_hash(link_quality_data),
+                                  [float(b) for b in link_quality_bounds],
+                                  name,
+                                  max_window,
+                                  plot)
+        except FileNotFoundError:
+            cache_key = None
+        if cache_key is not None:
+            found, output = cache.get(cache_key)
+            if found:
+                fig_theil, fig_autocorr, profile, profiling_output = output
+                if print_output:
+                    print(profiling_output)
+                if return_profile:
+                    return fig_theil, fig_autocorr, profile
+                return fig_theil, fig_autocorr
+
     ##
     # Checking the inputs
     ##
     if isinstance(link_quality_data, str):
         try:
-            link_quality_data = pd.read_csv(   link_quality_data,
-                                delimiter=',',
-                                names=['date_time', 'link_quality'],
-                                header=0,
-                                usecols=[0,1], # consider only the first two columns
-                                )
+            # consider only the first two columns
+            date_time, data = read_two_columns(link_quality_data, dates=True)
         except FileNotFoundError:
             print(repr(link_quality_data) + " not found")
+            if return_profile:
+                return None, None, None
             return None, None
     elif isinstance(link_quality_data, pd.DataFrame):
         # Data must be a dataframe with (at least) two columns (can also be index)
         # - link_quality
         # - date_time
-        link_quality_data.reset_index(inplace=True)
         try:
-            df = link_quality_data[['date_time', 'link_quality']]
+            data = link_quality_data['link_quality'].values
+            if 'date_time' in link_quality_data.columns:
+                date_time = link_quality_data['date_time'].values
+            elif isinstance(link_quality_data.index, pd.DatetimeIndex):
+                date_time = link_quality_data.index
+            else:
+                raise KeyError('date_time')
         except KeyError:
             raise ValueError("Input DataFrame must contain columns names 'date_time' and 'link_quality'.")
+    elif isinstance(link_quality_data, tuple) and len(link_quality_data) == 2:
+        date_time = as_array(link_quality_data[0])
+        data = as_array(link_quality_data[1])
+        if len(date_time) != len(data):
+            raise ValueError("Input arrays 'date_time' and 'link_quality' must be of the same length.")
     else:
-        raise ValueError("Wrong input type. Expect a string or a DataFrame, got "+repr(link_quality_data)+".")
+        raise ValueError("Wrong input type. Expect a string, a DataFrame or a tuple (date_time, link_quality), got "+repr(link_quality_data)+".")
 
 
     # Parse dates
-    if 'date_time' in link_quality_data.columns:
-        link_quality_data['date_time'] = pd.to_datetime(
-                                            link_quality_data['date_time'],
-                                            utc=True)
-        link_quality_data.set_index('date_time')
-    # Make sure the DataFrame is sorted
-    link_quality_data.sort_index(inplace=True)
+    date_time = pd.DatetimeIndex(pd.to_datetime(date_time, utc=True))
+    # Make sure the series is sorted (only reordered when needed)
+    if not date_time.is_monotonic_increasing:
+        order = np.argsort(date_time.values, kind='stable')
+        date_time = date_time[order]
+        data = data[order]
 
     profiling_output += '\nProfiling time span\n'
-    profiling_output += 'from \t\t%s\n' % link_quality_data.index[0]
-    profiling_output += 'to \t\t%s\n' % link_quality_data.index[-1]
+    profiling_output += 'from \t\t%s\n' % date_time[0]
+    profiling_output += 'to \t\t%s\n' % date_time[-1]
+    granularity = date_time[1] - date_time[0]
     profiling_output += '\nProfiling granularity\n'
-    profiling_output += '\t\t%s\n' % (  link_quality_data.index[1]
-                                        - link_quality_data.index[0] )
+    profiling_output += '\t\t%s\n' % granularity
     profiling_output += '\n# ---------------------------------------------------------------- \n'
 
     ##
@@ -182,62 +463,127 @@ def network_profiling(  link_quality_data,
     ##
 
     # Compute the trend of link quality data
-    results = convergence_test( link_quality_data.index,
-                                link_quality_data.link_quality.values,
+    results = convergence_test( date_time,
+                                data,
                                 link_quality_bounds,
                                 convergence['confidence'],
                                 convergence['tolerance'])
 
     # Plot the time series and its trend
-    default_layout={'xaxis' : {'title':None},
-                    'yaxis' : {'title':name}}
-    datetime = np.array(link_quality_data.index, dtype=object)
-    fig_theil = theil_plot( link_quality_data.link_quality.values,
-                            x=datetime,
-                            convergence_data=results,
-                            layout=default_layout)
+    if plot:
+        from triplots import theil_plot, autocorr_plot
+        default_layout={'xaxis' : {'title':None},
+                        'yaxis' : {'title':name}}
+        datetime = np.array(date_time, dtype=object)
+        fig_theil = theil_plot( data,
+                                x=datetime,
+                                convergence_data=results,
+                                layout=default_layout)
+    else:
+        fig_theil = None
 
     ##
     # Stationarity test
     ##
 
-    # Replace missing samples with the series median
-    # -> We need continuous data for autocorrelation
-    data = link_quality_data.link_quality.values
-    data[np.isnan(data)] = np.nanmedian(data)
-
+    # Missing samples are handled by the (gap-aware) autocorrelation
     stationary = independence_test(data)
+    profile = { 'converged': results[0],
+                'iid': stationary,
+                'granularity': granularity,
+                'seasonal_periods': [],
+                'window_sizes': np.array([1]),
+                'window_iid': np.array([stationary]),
+                'min_window': 1 if stationary else None,
+                'time_span': granularity if stationary else None,
+                'segments': [],
+                }
+
     if stationary:
         profiling_output += '\nNetwork link quality appears I.I.D.'
         profiling_output += '(95%% confidence)\n'
     else:
-        profiling_output += '\nNetwork link quality does NOT appears I.D.D. !\n\n'
-        # profiling_output += '\nNetwork link quality does NOT appears I.D.D. !\nSearching for a suitable time interval...\n\n'
+        profiling_output += '\nNetwork link quality does NOT appears I.D.D. !\nSearching for a suitable time interval...\n\n'
 
     # Plot the autocorrelation
-    fig_autocorr = autocorr_plot(data, show=False)
-
-#     # Search for a suitable test window
-#     window_size = 1
-#     while not stationary:
-#         window_size += 1
-#         data_subsampled = [np.nanmean(np.array(data[i:i+window_size])) for i in np.arange(0, len(data), window_size)]
-#         stationary = independence_test(data_subsampled)
-#         profiling_output += 'Window size: %g\tStationary: %i\n' % (window_size, stationary)
-# #         plot_autocorr(data_subsampled)
-#
-#     # Compute the corresponding time span
-#     time_span = link_quality_data.index[window_size] - link_quality_data.index[0]
-#
-#     profiling_output += '\n\nWith a confidence of 95%\n'
-#     profiling_output += 'network link quality appears stationary over a \n'
-#     profiling_output += 'time span of'
-#     profiling_output += '\t%s\n' % (time_span)
-#     profiling_output += '\n# ---------------------------------------------------------------- \n'
+    if plot:
+        fig_autocorr = autocorr_plot(data, show=False)
+    else:
+        fig_autocorr = None
+
+    ##
+    # Seasonality detection
+    ##
+    if not stationary:
+
+        # Dominant seasonal periods
+        periods, _ = seasonal_periods(data)
+        profile['seasonal_periods'] = [p*granularity for p in periods]
+        if len(periods):
+            profiling_output += 'Dominant seasonal periods\n'
+            for period in profile['seasonal_periods']:
+                profiling_output += '\t\t%s\n' % period
+        else:
+            profiling_output += 'No dominant seasonal period found.\n'
+
+        # Search for a suitable test window,
+        # all candidate window sizes at once
+        if max_window is None:
+            max_window = len(data) // 10
+        max_window = max(1, min(max_window, len(data) // 2))
+        window_sizes, window_iid = window_independence(data, max_window)
+        profile['window_sizes'] = window_sizes
+        profile['window_iid'] = window_iid
+
+        if window_iid.any():
+            window_size = int(window_sizes[np.argmax(window_iid)])
+            profile['min_window'] = window_size
+            profile['time_span'] = window_size*granularity
+
+            profiling_output += '\nWith a confidence of 95%\n'
+            profiling_output += 'network link quality appears stationary over a \n'
+            profiling_output += 'time span of'
+            profiling_output += '\t%s\n' % profile['time_span']
+        else:
+            profiling_output += ('\nNo window of up to %i samples over which network link quality appears I.I.D.\n'
+                                 % max_window)
+        profiling_output += '\n# ---------------------------------------------------------------- \n'
+
+    ##
+    # Stationary segments
+    ##
+    if not (stationary and results[0]):
+
+        bounds = changepoint_segmentation(data)
+        profiling_output += '\nSegments of constant link quality\n'
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            segment_time = date_time[start:stop]
+            segment_data = data[start:stop]
+            if np.count_nonzero(~np.isnan(segment_data)) > 2:
+                segment_converged = convergence_test(   segment_time,
+                                                        segment_data,
+                                                        link_quality_bounds,
+                                                        convergence['confidence'],
+                                                        convergence['tolerance'])[0]
+            else:
+                segment_converged = False
+            profile['segments'].append({'start': segment_time[0],
+                                        'end': segment_time[-1],
+                                        'converged': segment_converged})
+            profiling_output += 'from %s to %s\t%s\n' % (
+                                    segment_time[0],
+                                    segment_time[-1],
+                                    'stationary' if segment_converged else 'NOT stationary')
+        profiling_output += '\n# ---------------------------------------------------------------- \n'
+
+    if cache_key is not None:
+        cache.put(cache_key, (fig_theil, fig_autocorr, profile, profiling_output))
 
     if print_output:
         print(profiling_output)
 
+    if return_profile:
+        return fig_theil, fig_autocorr, profile
     return fig_theil, fig_autocorr
 
 # ----------------------------------------------------------------------------------------------------------------------------
@@ -357,6 +703,175 @@ def experiment_sizing(percentile,
 
     return N_one, N_two
 
+def experiment_planning(population,
+                        percentile,
+                        confidence,
+                        sizes,
+                        CI_class='one-sided',
+                        n_simulations=10000,
+                        jobs=1,
+                        seed=None,
+                        verbose=False):
+    """
+    Monte Carlo prediction of the width of TriScale's CIs for candidate
+    numbers of runs.
+
+    `experiment_sizing` returns the minimal number of runs for which a CI
+    exists; this function predicts how tight the CI is expected to be. For
+    each candidate number of runs N, `n_simulations` experiments of N runs
+    are drawn from `population`, and the bounds of the Thompson CI [2] are
+    read from each experiment with `np.partition`. The experiments are
+    drawn as matrices (one experiment per row), in chunks processed in
+    parallel by `jobs` threads.
+
+    The width of a one-sided CI (a KPI) is the distance between the bound
+    and the percentile of the population; the width of a two-sided CI is
+    the distance between its two bounds (i.e., the variability score).
+
+    Parameters
+    ----------
+    population : 1-d np.array, list, scipy.stats frozen distribution or callable
+        - When data (e.g., from a pilot campaign), experiments are drawn by
+        resampling the data with replacement.
+        - When a distribution (with a `rvs` method), experiments are drawn
+        from the distribution.
+        - When a callable, `population(rng, shape)` must return an array of
+        shape `shape` of random draws, using the NumPy Generator `rng`.
+    percentile : float
+        Percentile to estimate, must be between 0 and 100
+    confidence : float
+        Confidence level of the estimation, must be between 0 and 100
+    sizes : list of integers
+        Candidate numbers of runs.
+    CI_class : 'one-sided' or 'two-sided', optional
+        The class of confidence interval: one-sided for a KPI, two-sided
+        for a variability score.
+        Default : 'one-sided'
+    n_simulations : integer, optional
+        Number of simulated experiments for each candidate number of runs.
+        Default : 10000
+    jobs : integer, optional
+        Number of threads running the simulations.
+        Default : 1
+    seed : integer or None, optional
+        Seed of the random number generators. The results do not depend on
+        the number of `jobs`.
+        Default : None
+    verbose : True/False, optional
+        When true, print non-functional and intermediary outputs.
+        Default : False
+
+    Returns
+    -------
+    summary : pandas DataFrame
+        One row per candidate number of runs, with the indices of the CI
+        bounds ('LB', 'UB') and statistics of the CI width ('mean',
+        'median', '5%', '95%'). The statistics are NaN when no CI exists
+        for that number of runs.
+    widths : dictionary
+        Maps each candidate number of runs to the array of simulated CI
+        widths (empty when no CI exists).
+
+    References
+    ----------
+    .. [1] Anonymous, "TriScale: A Framework Supporting Reproducible
+        Performance Evaluations in Networking", 2020,
+        https://doi.org/10.5281/zenodo.3464273
+    .. [2] William R. Thompson, "On Confidence Ranges for the Median and Other
+        Expectation Distributions for Populations of Unknown Distribution Form",
+        The Annals of Mathematical Statistics, 7(3):122–128, 1936.
+
+    """
+
+    ##
+    # Checking the inputs
+    ##
+    if not (CI_class == 'one-sided' or CI_class == 'two-sided'):
+        raise ValueError("Invalid CI_class: "+repr(CI_class)+". Valid 'CI_class' values: 'one-sided' or 'two-sided'")
+    if CI_class == 'one-sided' and percentile == 50:
+        raise ValueError("The one-sided CI of the median is ambiguous: provide a percentile different from 50.")
+
+    # How to draw experiments
+    if hasattr(population, 'rvs'):
+        draw = lambda rng, shape: population.rvs(size=shape, random_state=rng)
+    elif callable(population):
+        draw = population
+    else:
+        pilot = np.asarray(population, dtype=float)
+        pilot = pilot[~np.isnan(pilot)]
+        if len(pilot) == 0:
+            raise ValueError("The pilot data contains no data point.")
+        draw = lambda rng, shape: pilot[rng.integers(0, len(pilot), shape)]
+
+    # Percentile of the population, reference for the one-sided CI widths
+    if CI_class == 'one-sided':
+        if hasattr(population, 'ppf'):
+            reference = population.ppf(percentile/100)
+        elif callable(population):
+            reference = np.percentile(draw(np.random.default_rng(seed), (10**6,)), percentile)
+        else:
+            reference = np.percentile(pilot, percentile)
+
+    ##
+    # Simulations
+    ##
+
+    # Chunks of experiments (one experiment per row) of bounded memory
+    tasks = []
+    CIs = {}
+    for N in sizes:
+        LB, UB = CIs[N] = ThompsonCI(int(N), percentile, confidence, CI_class)
+        if np.isnan(LB) or np.isnan(UB):
+            continue
+        rows = max(1, 2**22 // int(N))
+        for start in range(0, n_simulations, rows):
+            tasks.append((int(N), int(LB), int(UB), min(rows, n_simulations-start)))
+    # One independent random stream per chunk: the results do not depend on `jobs`
+    streams = np.random.SeedSequence(seed).spawn(len(tasks))
+
+    def simulate(task, stream):
+        N, LB, UB, rows = task
+        experiments = draw(np.random.default_rng(stream), (rows, N))
+        if CI_class == 'two-sided':
+            experiments = np.partition(experiments, [LB, UB], axis=1)
+            return experiments[:,UB] - experiments[:,LB]
+        bound = UB if percentile > 50 else LB
+        experiments = np.partition(experiments, bound, axis=1)
+        return np.abs(experiments[:,bound] - reference)
+
+    if jobs > 1:
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            results = list(executor.map(simulate, tasks, streams))
+    else:
+        results = [simulate(task, stream) for task, stream in zip(tasks, streams)]
+
+    ##
+    # Outputs
+    ##
+    widths = {N: [] for N in sizes}
+    for task, result in zip(tasks, results):
+        widths[task[0]].append(result)
+
+    summary = []
+    for N in sizes:
+        LB, UB = CIs[N]
+        widths[N] = np.concatenate(widths[N]) if widths[N] else np.array([])
+        if len(widths[N]):
+            stats = [np.mean(widths[N])] + list(np.percentile(widths[N], [50, 5, 95]))
+        else:
+            stats = [np.nan]*4
+        summary.append([LB, UB] + stats)
+    summary = pd.DataFrame(summary,
+                           index=pd.Index(sizes, name='N'),
+                           columns=['LB', 'UB', 'mean', 'median', '5%', '95%'])
+
+    if verbose:
+        print('Expected width of the %s CI of the %g-th percentile (%g%% confidence)\n'
+              % (CI_class, percentile, confidence))
+        print(summary)
+
+    return summary, widths
+
 # ----------------------------------------------------------------------------------------------------------------------------
 # ANALYSIS_METRIC
 # ----------------------------------------------------------------------------------------------------------------------------
@@ -368,20 +883,31 @@ def analysis_metric(    data,
                         plot_out_name=None,
                         showplot=True,
                         custom_layout=None,
+                        cache=None,
+                        index=False,
+                        dtype=None,
                         verbose=False):
     """
     Computation of metrics as suggested by TriScale [1].
 
     Parameters
     ----------
-    data : string or pandas DataFrame
+    data : string, pandas DataFrame, tuple of arrays or TraceIndex
         The input data is a two-dimentional series used for the computation of
         the metric: one control variate (x), one independent variate (y).
         - When a string is passed, `data` is expected to be a name of a csv file
         (comma separated) with `x` data in the first column and `y` data in the
         second column.
+        The file may be compressed ('.gz', '.bz2', '.xz', '.zst') or be a
+        member of a zip archive (e.g., 'campaign.zip/run_1.csv'); it is
+        decompressed while being read, without extraction.
         - When a pandas DataFrame is passed, `data` must contain (at least)
         columns named `x` and `y`.
+        - When a tuple `(x, y)` is passed, `x` and `y` are array-likes of the
+        same length (NumPy arrays, memoryviews, Arrow arrays, ...). They
+        are used without copy whenever possible.
+        - When a `TraceIndex` is passed, the measures are computed from the
+        index (see `index`).
     metric : dictionary
         TriScale metric dictionary.
         - "measure" key is compulsory.
@@ -392,6 +918,10 @@ def analysis_metric(    data,
             + 'mean': arithmetic mean
             + 'minimum' : minimum
             + 'maximum' : maximum
+        The value can also be a list of such measures: all measures are then
+        computed from a single parsing of the data and a single pass over
+        the windows of the convergence test, and the outputs are lists
+        (one element per measure).
         Optional keys:
             - "bounds" : list-like of len 2.
             Expected extremal values for the measure, used for the convergence test.
@@ -406,6 +936,15 @@ def analysis_metric(    data,
         - "tolerance" : float, optional
         Tolerance for TriScale convergence test.
         Float between 0 and 100, default to 5.
+        - "window" : 'fixed', 'expanding' or 'time', optional
+        Windows used to compute the metric series for the convergence test.
+        'fixed': sliding windows, each containing half of the samples.
+        'expanding': windows of increasing size, from half to all of the
+        samples, all starting with the first sample.
+        'time': sliding windows, each spanning half of the time covered by
+        the samples (the 'x' values, which must be sorted). Suited to
+        bursty traces, without resampling.
+        Default to 'fixed'.
     plot : True/False, optional
         When true, generate a plot of the input data and convergence data
         (if any).
@@ -421,6 +960,35 @@ def analysis_metric(    data,
         Plotly layout dictionary to edit the default layout of the
         generated plot.
         Default : None
+    cache : string, ResultCache or None, optional
+        Directory of an on-disk cache (or a `ResultCache`) memoizing the
+        results, keyed by the content of `data` and the parameters of
+        `metric` and `convergence` that affect the results. Unchanged
+        inputs return the cached results without recomputation. Not used
+        when `plot` is True.
+        Default : None
+    index : True/False, optional
+        When true and `data` is a file name, the measures are computed from
+        the index of the trace stored next to the file (see `trace_index`;
+        the index is built on first use, and rebuilt when the file
+        changes). The cost of the convergence test is then proportional
+        to the number of windows, not to the length of the trace. The
+        window means, minima and maxima are exact, but the window
+        percentiles are approximated from the quantile sketches of the
+        index (rank error of about 1%): the metric series differs from the
+        exact one, which can change the outcome of the convergence test.
+        The measure returned without convergence test is exact (the
+        percentiles are computed from the samples).
+        Default : False
+    dtype : NumPy float type or None, optional
+        Type of the samples of `y` during the analysis. With np.float32,
+        the samples use half the memory of float64: the data is parsed to
+        float32 (integer time stamps are kept as int64), and the windows
+        and percentiles are computed on float32 samples. The means and the
+        convergence test (metric series, Theil-Sen regression) are
+        computed in float64. Arrays passed as input are converted (with a
+        copy) when their type differs. When None, float64 is used.
+        Default : None
     verbose : True/False, optional
         When true, print non-functional and intermediary outputs.
         Default : False
@@ -432,9 +1000,14 @@ def analysis_metric(    data,
         `convergence["expected"] == True`
         Always True otherwise.
     measure :
-        The computed metric measure, interpolated to `nearest`.
+        The computed metric measure: without convergence test, the measure
+        over all samples (percentiles interpolated to `nearest`); with the
+        convergence test, the median of the metric series (interpolated to
+        `nearest`, approximate with `index`).
     figure : plotly graphical object or None
         The generated plot when `plot == True`
+    When `metric["measure"]` is a list, each output is a list with one
+    element per measure (each measure has its own convergence test).
 
     References
     ----------
@@ -463,44 +1036,101 @@ def analysis_metric(    data,
     # Checking the inputs
     ##
 
+    # Work on copies: the caller's dictionaries are not modified
+    metric = dict(metric)
+    if convergence is not None:
+        convergence = dict(convergence)
+
+    # One or several measures
+    multiple_measures = isinstance(metric['measure'], (list, tuple))
+    if multiple_measures:
+        measures = list(metric['measure'])
+        failed_output = ([False]*len(measures), [np.nan]*len(measures), None)
+    else:
+        measures = [metric['measure']]
+        failed_output = (False, np.nan, None)
+
+    # Cached results
+    if cache is not None and not plot:
+        if not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+        if convergence is not None and convergence.get('expected') == True:
+            convergence_spec = (convergence.get('confidence', 95),
+                                convergence.get('tolerance', 5),
+                                convergence.get('window', 'fixed'))
+        else:
+            convergence_spec = None
+        try:
+            cache_key = cache.key('analysis_metric',
+                                  content_hash(data),
+                                  bool(index) or isinstance(data, TraceIndex),
+                                  None if dtype is None else np.dtype(dtype).str,
+                                  [value if isinstance(value, str) else float(value) for value in measures],
+                                  multiple_measures,
+                                  None if 'bounds' not in metric else [float(b) for b in metric['bounds']],
+                                  convergence_spec)
+        except FileNotFoundError:
+            cache_key = None
+        if cache_key is not None:
+            found, output = cache.get(cache_key)
+            if found:
+                return output + (None,)
+    else:
+        cache_key = None
+
     # Parse data
-    if isinstance(data, str):
+    if index and isinstance(data, str):
         try:
-            df = pd.read_csv(   data,
-                                delimiter=',',
-                                names=['x', 'y'],
-                                header=0,
-                                usecols=[0,1], # consider only the first two columns
-                                )
+            data = trace_index(data, dtype=dtype)
         except FileNotFoundError:
             print(repr(data) + " not found")
-            return False, np.nan, None
+            return failed_output
+    if isinstance(data, TraceIndex):
+        samples_x = data.x
+        samples_y = data.y
+    elif isinstance(data, str):
+        try:
+            # consider only the first two columns
+            samples_x, samples_y = read_two_columns(data, dtype=dtype)
+        except FileNotFoundError:
+            print(repr(data) + " not found")
+            return failed_output
     elif isinstance(data, pd.DataFrame):
         try:
-            df = data[['x', 'y']]
+            samples_x = data['x'].values
+            samples_y = data['y'].values
         except KeyError:
             raise ValueError("Input DataFrame must contain columns names 'x' and 'y'.")
+    elif isinstance(data, tuple) and len(data) == 2:
+        samples_x = as_array(data[0])
+        samples_y = as_array(data[1])
+        if samples_x.shape != samples_y.shape or samples_x.ndim != 1:
+            raise ValueError("Input arrays 'x' and 'y' must be one-dimensional and of the same length.")
     else:
-        raise ValueError("Wrong input type. Expect a string or a DataFrame, got "+repr(data)+".")
+        raise ValueError("Wrong input type. Expect a string, a DataFrame or a tuple (x, y), got "+repr(data)+".")
+    if dtype is not None and not isinstance(data, TraceIndex):
+        samples_y = samples_y.astype(dtype, copy=False)
 
 
-    # Verify that the csv file is not empty (at least some 'y' data is in there)
-    df.dropna(inplace=True)
-    if len(df.index) < 2:
+    # Verify that the data is not empty (at least some 'y' data is in there)
+    if not isinstance(data, TraceIndex):
+        samples_x, samples_y = valid_samples(samples_x, samples_y)
+    if len(samples_y) < 2:
         if verbose:
             print("%s\n-> Input data has only %d data points (min 2 required)\n"
-                            % ( repr(data), len(df.index) ))
-        return False, np.nan, None
+                            % ( repr(data), len(samples_y) ))
+        return failed_output
 
     # Initialize convenience variables
-    samples_x  = df.x.values
-    samples_y  = df.y.values
     metric_y = []
     metric_x = []
 
     # Metric
     if 'bounds' not in metric:
-        metric['bounds'] = [df.y.min(), df.y.max()]
+        if isinstance(data, TraceIndex):
+            metric['bounds'] = [data.min, data.max]
+        else:
+            metric['bounds'] = [samples_y.min(), samples_y.max()]
 
     if (('name' not in metric) or
         (metric['name'] is None)):
@@ -524,6 +1154,11 @@ def analysis_metric(    data,
         if 'tolerance' not in convergence:
             # Default to 5% tolerance
             convergence['tolerance'] = 5
+        if 'window' not in convergence:
+            # Default to sliding windows of fixed size
+            convergence['window'] = 'fixed'
+        elif convergence['window'] not in ['fixed', 'expanding', 'time']:
+            raise ValueError("Invalid window: "+repr(convergence['window'])+". Valid 'window' values: 'fixed', 'expanding' or 'time'")
     else:
         run_convergence_test = False
 
@@ -532,105 +1167,89 @@ def analysis_metric(    data,
     ##
     if run_convergence_test:
 
-        # Compute the metric series
-        fixed_window=True
-        if fixed_window:
-            ## Version with fixed window size
-            nb_chuncks = min(int(len(samples_y)/2)+1, 100)
-            chunck_len = int(len(samples_y)/2)
-            step = chunck_len/(nb_chuncks-1)
-            for i in range(0,nb_chuncks):
-                start_index = int(i*step)
-                stop_index = start_index+chunck_len
-                # Show the sample in the middle of the sliding window
-                metric_x.append(samples_x[int(start_index+chunck_len/2)])
-
-                if isinstance(metric['measure'], str):
-                    if metric['measure'] == 'mean':
-                        metric_y.append(np.mean(samples_y[start_index:stop_index]))
-                    elif metric['measure'] == 'minimum':
-                        metric_y.append(np.amin(samples_y[start_index:stop_index]))
-                    elif metric['measure'] == 'maximum':
-                        metric_y.append(np.amax(samples_y[start_index:stop_index]))
-                    else:
-                        raise ValueError('Unsupported measure')
-                else:
-                    metric_y.append(np.percentile(  samples_y[start_index:stop_index],
-                                                    metric['measure'],
-                                                    interpolation='midpoint' ))
+        # Compute the metric series, for all measures at once
+        if isinstance(data, TraceIndex):
+            metric_x, starts, stops = convergence_windows(samples_x, convergence['window'])
+            metric_y = data.windows_measures(starts, stops, measures)
+        elif convergence['window'] == 'fixed':
+            metric_x, metric_y = sliding_window_measures(samples_x,
+                                                         samples_y,
+                                                         measures)
+        elif convergence['window'] == 'expanding':
+            metric_x, metric_y = expanding_window_measures(samples_x,
+                                                           samples_y,
+                                                           measures)
         else:
-            ## Version with increasing window size
-            if len(samples_y) > 200:
-                nb_chuncks = 200
-            else:
-                nb_chuncks = len(samples_y)
-            for chuncks in range(0,int(nb_chuncks/2)):
-                chunck_x   = chuncks*2+1
-                chunck_len = int((int(nb_chuncks/2+chuncks)*len(samples_y)/nb_chuncks))
-                if isinstance(metric['measure'], str):
-                    if metric['measure'] == 'mean':
-                        metric_y.append(np.mean(samples_y[:chunck_len]))
-                    else:
-                        raise ValueError('Unsupported measure')
-                else:
-                    metric_y.append(np.percentile(  samples_y[:chunck_len],
-                                                    metric['measure'],
-                                                    interpolation='midpoint' ))
-                metric_x.append(samples_x[int(chunck_x*len(samples_y)/nb_chuncks)])
-                # print(chunck_x, metric_x)
+            metric_x, metric_y = time_window_measures(samples_x,
+                                                      samples_y,
+                                                      measures)
 
         # Convergence test
-        results = convergence_test(np.array(metric_x),
-                                   np.array(metric_y),
-                                   metric['bounds'],
-                                   convergence['confidence'],
-                                   convergence['tolerance'],
-                                   verbose=verbose)
-
-        if results[0]:
-            has_converged = True
+        if multiple_measures:
+            results = convergence_test_rows(metric_x,
+                                            metric_y,
+                                            [metric['bounds']]*len(measures),
+                                            convergence['confidence'],
+                                            convergence['tolerance'],
+                                            verbose=verbose)
         else:
-            has_converged = False
+            results = [convergence_test(metric_x,
+                                        metric_y[0],
+                                        metric['bounds'],
+                                        convergence['confidence'],
+                                        convergence['tolerance'],
+                                        verbose=verbose)]
+
+        has_converged = [bool(result[0]) for result in results]
 
         # Produce the output string
         if verbose:
-            if has_converged:
-                flag_convergence1 = '[ PASSING ]'
-                flag_convergence2 = ''
-                preprocessing_warning = '\n'
-            else:
-                flag_convergence1 = '[ FAILED ]'
-                flag_convergence2 = 'NOT '
-                preprocessing_warning = '\n[ WARNING ] These data should not be used to estimate \nthe long-term performance of the system under test!\n'
-
-            preprocessing_output = ''
-            preprocessing_output += '%s\n' % flag_convergence1
-            preprocessing_output += 'With a confidence level of \t%g%%\n' % (convergence['confidence'])
-            preprocessing_output += 'given a tolerance of \t\t%g%%\n' % (convergence['tolerance'])
-            preprocessing_output += 'Run has %sconverged.\n' % flag_convergence2
-            preprocessing_output += '%s' % preprocessing_warning
-
-            print(preprocessing_output)
+            for measure, measure_converged in zip(measures, has_converged):
+                if measure_converged:
+                    flag_convergence1 = '[ PASSING ]'
+                    flag_convergence2 = ''
+                    preprocessing_warning = '\n'
+                else:
+                    flag_convergence1 = '[ FAILED ]'
+                    flag_convergence2 = 'NOT '
+                    preprocessing_warning = '\n[ WARNING ] These data should not be used to estimate \nthe long-term performance of the system under test!\n'
+
+                preprocessing_output = ''
+                if multiple_measures:
+                    preprocessing_output += 'Measure \t\t\t%s\n' % measure
+                preprocessing_output += '%s\n' % flag_convergence1
+                preprocessing_output += 'With a confidence level of \t%g%%\n' % (convergence['confidence'])
+                preprocessing_output += 'given a tolerance of \t\t%g%%\n' % (convergence['tolerance'])
+                preprocessing_output += 'Run has %sconverged.\n' % flag_convergence2
+                preprocessing_output += '%s' % preprocessing_warning
+
+                print(preprocessing_output)
     else:
-        results = None
+        results = [None]*len(measures)
+        metric_y = [metric_y]*len(measures)
 
     ##
     # Plot
     ##
     if plot:
-        default_layout={'title' : ('%s' % metric_label),
-                        'xaxis' : {'title':None},
-                        'yaxis' : {'title':metric_label}}
-        if custom_layout is not None:
-            default_layout.update(custom_layout)
-        figure = theil_plot(    samples_y,
-                                x=samples_x,
-                                metric_data=[metric_x, metric_y],
-                                convergence_data=results,
-                                layout=default_layout,
-                                out_name=plot_out_name)
-        if showplot:
-            figure.show()
+        from triplots import theil_plot
+        figure = []
+        for row in range(len(measures)):
+            default_layout={'title' : ('%s' % metric_label),
+                            'xaxis' : {'title':None},
+                            'yaxis' : {'title':metric_label}}
+            if custom_layout is not None:
+                default_layout.update(custom_layout)
+            figure.append(theil_plot(   samples_y,
+                                        x=samples_x,
+                                        metric_data=[metric_x, metric_y[row]],
+                                        convergence_data=results[row],
+                                        layout=default_layout,
+                                        out_name=plot_out_name))
+            if showplot:
+                figure[-1].show()
+        if not multiple_measures:
+            figure = figure[0]
     else:
         figure = None
 
@@ -639,29 +1258,412 @@ def analysis_metric(    data,
     ##
 
     if run_convergence_test:
-        # Test failed
-        if not has_converged:
-            return False, np.nan, figure
-        # Test passed
-        else:
-            # return the median of the computed metric data
-            return True, np.percentile(metric_y, 50 , interpolation='nearest'), figure
+        measure = []
+        for row in range(len(measures)):
+            # Test failed
+            if not has_converged[row]:
+                measure.append(np.nan)
+            # Test passed
+            else:
+                # return the median of the computed metric data
+                measure.append(np.percentile(metric_y[row], 50 , interpolation='nearest'))
     else:
-        if isinstance(metric['measure'], str):
-            if metric['measure'] == 'mean':
-                measure = np.mean(df.y.values)
-            elif metric['measure'] == 'minimum':
-                measure = np.amin(df.y.values)
-            elif metric['measure'] == 'maximum':
-                measure = np.amax(df.y.values)
+        has_converged = [True]*len(measures)
+        measure = []
+        for value in measures:
+            if isinstance(value, str):
+                if isinstance(data, TraceIndex):
+                    # Exact, from the block summaries
+                    measure.append(data.window_measures(0, len(data), [value])[0])
+                elif value == 'mean':
+                    measure.append(np.mean(samples_y, dtype=np.float64))
+                elif value == 'minimum':
+                    measure.append(np.amin(samples_y))
+                elif value == 'maximum':
+                    measure.append(np.amax(samples_y))
+                else:
+                    raise ValueError('Unsupported measure')
             else:
-                raise ValueError('Unsupported measure')
+                measure.append(np.nan)
+        # All percentiles from one partition of the samples
+        percentiles = [row for row, value in enumerate(measures) if not isinstance(value, str)]
+        if percentiles:
+            values = np.percentile(samples_y,
+                                   [measures[row] for row in percentiles],
+                                   interpolation='nearest')
+            for row, value in zip(percentiles, values):
+                measure[row] = value
+
+    if multiple_measures:
+        output = (has_converged, measure)
+    else:
+        output = (has_converged[0], measure[0])
+    if cache_key is not None:
+        cache.put(cache_key, output)
+    return output + (figure,)
+
+
+
+def analysis_metric_online(  samples,
+                             metric,
+                             convergence=None,
+                             checkpoints=1000,
+                             patience=5,
+                             max_blocks=512,
+                             sketch_size=64,
+                             chunk_size=10000,
+                             verbose=False):
+    """
+    Online computation of metrics, as suggested by TriScale [1].
+
+    This is the online mode of `analysis_metric`: the samples are consumed
+    as a stream and TriScale's convergence test is re-evaluated at
+    regular checkpoints, on the samples received so far. The function
+    returns as soon as the convergence test passes (the earliest run
+    duration after which the run can be stopped), or as soon as the
+    convergence clearly fails.
+
+    The stream is summarized into at most `max_blocks` blocks of
+    consecutive samples. When the number of blocks exceeds the limit,
+    adjacent blocks are merged. Each block keeps its count, sum, min, max,
+    and a sketch of at most `sketch_size` values for percentile measures.
+    The memory usage is therefore bounded, regardless of the length of the
+    stream. The windows of the convergence test are computed from the
+    block summaries; they are exact for 'mean', 'minimum' and 'maximum',
+    and approximate for percentiles once blocks have been merged.
+
+    Parameters
+    ----------
+    samples : string or iterable
+        The stream of (x, y) samples.
+        - When a string is passed, `samples` is expected to be a name of a
+        csv file (comma separated) with `x` data in the first column and `y`
+        data in the second column, which is read by chunks of `chunk_size`.
+        The file may be compressed ('.gz', '.bz2', '.xz', '.zst') or be a
+        member of a zip archive (e.g., 'campaign.zip/run_1.csv'); it is
+        decompressed while being read, without extraction.
+        - Otherwise, `samples` must yield (x, y) pairs, where x and y are
+        either single values or arrays of values, or pandas DataFrames
+        with columns named `x` and `y`.
+    metric : dictionary
+        TriScale metric dictionary; see `analysis_metric`.
+        When no "bounds" are provided, the extremal values of the samples
+        received so far are used.
+    convergence : dictionary or None
+        TriScale convergence dictionary; see `analysis_metric`.
+        Default to 95% confidence and 5% tolerance.
+    checkpoints : integer or list of integers, optional
+        When an integer, the convergence test is evaluated every
+        `checkpoints` samples. When a list, the convergence test is
+        evaluated after the given numbers of samples.
+        Default : 1000
+    patience : integer or None, optional
+        Number of consecutive checkpoints at which the convergence must
+        clearly fail (i.e., the CI on the trend lies entirely outside the
+        tolerance) before the run is declared as failing.
+        When None, the function never returns early on failures.
+        Default : 5
+    max_blocks : integer, optional
+        Maximal number of block summaries kept in memory.
+        Default : 512
+    sketch_size : integer, optional
+        Maximal number of values kept per block for percentile measures.
+        Default : 64
+    chunk_size : integer, optional
+        Number of rows read at once when `samples` is a file name.
+        Default : 10000
+    verbose : True/False, optional
+        When true, print non-functional and intermediary outputs.
+        Default : False
+
+    Returns
+    -------
+    convergence test result : True/False
+        True if the convergence test passed at one of the checkpoints.
+    measure :
+        The metric measure at the first passing checkpoint,
+        NaN if the convergence test never passed.
+    checkpoint : dictionary
+        - "samples" : number of samples consumed when the function returned
+        - "x" : x value of the last sample consumed
+        - "status" : 'passed', 'failed' (the convergence clearly failed),
+        or 'pending' (the stream ended before any decision)
+
+    References
+    ----------
+    .. [1] Anonymous, "TriScale: A Framework Supporting Reproducible
+        Performance Evaluations in Networking", 2020,
+        https://doi.org/10.5281/zenodo.3464273
+
+    """
+
+    ##
+    # Checking the inputs
+    ##
+
+    if convergence is None:
+        convergence = {}
+    confidence = convergence.get('confidence', 95)
+    tolerance = convergence.get('tolerance', 5)
+
+    if isinstance(checkpoints, int):
+        if checkpoints < 4:
+            raise ValueError("Invalid checkpoints: "+repr(checkpoints)+". Provide an integer larger than 3.")
+        next_checkpoints = None
+    else:
+        next_checkpoints = sorted(checkpoints, reverse=True)
+
+    if isinstance(samples, str):
+        try:
+            samples = read_csv_chunks(  samples,
+                                        chunk_size,
+                                        delimiter=',',
+                                        names=['x', 'y'],
+                                        header=0,
+                                        usecols=[0,1], # consider only the first two columns
+                                        )
+        except FileNotFoundError:
+            print(repr(samples) + " not found")
+            return False, np.nan, None
+
+    def checkpoint_after(n):
+        if next_checkpoints is None:
+            return (n // checkpoints + 1) * checkpoints
+        while next_checkpoints and next_checkpoints[-1] <= n:
+            next_checkpoints.pop()
+        return next_checkpoints[-1] if next_checkpoints else np.inf
+
+    ##
+    # Stream processing
+    ##
+
+    blocks = []
+    block_size = 1
+    pending_x = np.array([])
+    pending_y = np.array([])
+    nb_samples = 0
+    nb_failed = 0
+    last_x = None
+    next_checkpoint = checkpoint_after(0)
+
+    for item in samples:
+
+        # Parse the next chunk of samples
+        if isinstance(item, pd.DataFrame):
+            chunk_x = item['x'].values
+            chunk_y = item['y'].values
         else:
-            measure = np.percentile(df.y.values, metric['measure'] , interpolation='nearest')
+            chunk_x = np.atleast_1d(item[0])
+            chunk_y = np.atleast_1d(item[1])
+        mask = ~np.isnan(chunk_y)
+        chunk_x = chunk_x[mask]
+        chunk_y = chunk_y[mask]
+
+        while chunk_y.size:
+
+            # Add samples up to the next checkpoint
+            take = int(min(chunk_y.size, next_checkpoint - nb_samples))
+            pending_x = np.concatenate((pending_x, chunk_x[:take]))
+            pending_y = np.concatenate((pending_y, chunk_y[:take]))
+            last_x = chunk_x[take-1]
+            chunk_x = chunk_x[take:]
+            chunk_y = chunk_y[take:]
+            nb_samples += take
+
+            # Bound the memory usage: merge adjacent blocks
+            # until the new complete blocks fit
+            while len(blocks) + pending_y.size // block_size > max_blocks:
+                blocks = [merge_stream_blocks(blocks[k], blocks[k+1], sketch_size)
+                          if k+1 < len(blocks) else blocks[k]
+                          for k in range(0, len(blocks), 2)]
+                block_size *= 2
+
+            # Summarize complete blocks
+            nb_full = (pending_y.size // block_size) * block_size
+            for start in range(0, nb_full, block_size):
+                blocks.append(stream_block( pending_x[start:start+block_size],
+                                            pending_y[start:start+block_size],
+                                            sketch_size))
+            pending_x = pending_x[nb_full:]
+            pending_y = pending_y[nb_full:]
+
+            if nb_samples < next_checkpoint:
+                continue
+            next_checkpoint = checkpoint_after(nb_samples)
+
+            ##
+            # Convergence test at the checkpoint
+            ##
+            windows = list(blocks)
+            if pending_y.size:
+                windows.append(stream_block(pending_x, pending_y, sketch_size))
+            edges = np.concatenate(([0], np.cumsum([block['count'] for block in windows])))
+
+            # Sliding windows, as in analysis_metric
+            nb_chuncks = min(int(nb_samples/2)+1, 100)
+            chunck_len = int(nb_samples/2)
+            step = chunck_len/(nb_chuncks-1)
+            start_index = (np.arange(nb_chuncks)*step).astype(int)
+            bounds_index = np.stack((start_index,
+                                     start_index+chunck_len,
+                                     start_index+chunck_len//2))
+            # Map the sample indexes to the nearest block edges
+            block_index = np.clip(np.searchsorted(edges, bounds_index), 1, len(edges)-1)
+            block_index -= ((bounds_index - edges[block_index-1])
+                            < (edges[block_index] - bounds_index))
+            metric_x = []
+            metric_y = []
+            for start, stop, middle in block_index.T:
+                stop = max(stop, start+1)
+                metric_x.append(windows[min(middle, len(windows)-1)]['x'])
+                metric_y.append(stream_window_measure(windows[start:stop],
+                                                      metric['measure']))
+
+            if 'bounds' in metric:
+                y_bounds = metric['bounds']
+            else:
+                y_bounds = [min(block['min'] for block in windows),
+                            max(block['max'] for block in windows)]
+            if y_bounds[0] == y_bounds[1]:
+                status = 'passed'
+            else:
+                status = convergence_status(np.array(metric_x),
+                                            np.array(metric_y),
+                                            y_bounds,
+                                            confidence,
+                                            tolerance)
+            if verbose:
+                print('Checkpoint %i samples (x = %s)\t%s' % (nb_samples, last_x, status))
+
+            if status == 'passed':
+                measure = np.percentile(metric_y, 50, interpolation='nearest')
+                return True, measure, {'samples': nb_samples, 'x': last_x, 'status': status}
+            elif status == 'failed':
+                nb_failed += 1
+                if patience is not None and nb_failed >= patience:
+                    return False, np.nan, {'samples': nb_samples, 'x': last_x, 'status': status}
+            else:
+                nb_failed = 0
 
-        return True, measure, figure
+    return False, np.nan, {'samples': nb_samples, 'x': last_x, 'status': 'pending'}
 
+def _analysis_metric_task(task):
+    """
+    Worker of `analysis_metric_parallel`: compute the metric of one run,
+    from a file name or from the bounds of the run in the shared samples,
+    and write the results in the shared output arrays.
+    """
+    run, samples, outputs, metric, convergence = task
+    if isinstance(run, str):
+        data = run
+    else:
+        start, stop = run
+        data = (SharedArrayPool.attach(samples[0])[start:stop],
+                SharedArrayPool.attach(samples[1])[start:stop])
+    has_converged, measure, _ = analysis_metric(data, metric, convergence)
+    row = outputs[0]
+    SharedArrayPool.attach(outputs[1])[row] = has_converged
+    SharedArrayPool.attach(outputs[2])[row] = measure
+
+def analysis_metric_parallel(runs,
+                             metric,
+                             convergence=None,
+                             jobs=None,
+                             verbose=False):
+    """
+    Computation of the metric of many runs (see `analysis_metric`), in
+    parallel, by `jobs` worker processes.
 
+    The samples of all runs given as arrays are copied once in two shared
+    memory blocks (x and y values), and the results are written by the
+    workers in preallocated shared output arrays (see `SharedArrayPool`):
+    the workers only receive the bounds of their runs in the shared
+    samples, so no array is pickled. Runs given as file names are read by
+    the workers. The shared memory is released when the analysis ends,
+    also when a worker crashes.
+
+    Parameters
+    ----------
+    runs : list
+        The raw data of the runs: csv file names, DataFrames (with columns
+        `x` and `y`) or tuples `(x, y)` of array-likes, as expected by
+        `analysis_metric`. The x values (resp. y values) of all runs given
+        as arrays must have compatible types.
+    metric : dictionary
+        TriScale metric dictionary (see `analysis_metric`).
+    convergence : dictionary or None
+        TriScale convergence dictionary (see `analysis_metric`).
+    jobs : integer or None, optional
+        Number of worker processes (one per core when None).
+        Default : None
+    verbose : True/False, optional
+        When true, print non-functional and intermediary outputs.
+        Default : False
+
+    Returns
+    -------
+    has_converged : np.array of bool
+        The outcome of the convergence test of each run.
+    measures : np.array
+        The metric measure of each run.
+    When `metric["measure"]` is a list, the outputs have one row per run
+    and one column per measure.
+    """
+
+    multiple_measures = isinstance(metric['measure'], (list, tuple))
+    nb_measures = len(metric['measure']) if multiple_measures else 1
+
+    # Bounds of the runs in the shared samples (or file names)
+    tasks = []
+    arrays = []
+    offset = 0
+    for data in runs:
+        if isinstance(data, str):
+            tasks.append(data)
+            continue
+        if isinstance(data, pd.DataFrame):
+            try:
+                samples_x, samples_y = data['x'].values, data['y'].values
+            except KeyError:
+                raise ValueError("Input DataFrame must contain columns names 'x' and 'y'.")
+        elif isinstance(data, tuple) and len(data) == 2:
+            samples_x, samples_y = as_array(data[0]), as_array(data[1])
+        else:
+            raise ValueError("Wrong input type. Expect a string, a DataFrame or a tuple (x, y), got "+repr(data)+".")
+        if samples_x.shape != samples_y.shape or samples_x.ndim != 1:
+            raise ValueError("Input arrays 'x' and 'y' must be one-dimensional and of the same length.")
+        tasks.append((offset, offset + len(samples_y)))
+        arrays.append((tasks[-1], samples_x, samples_y))
+        offset += len(samples_y)
+
+    with SharedArrayPool(jobs) as pool:
+        samples = None
+        if arrays:
+            samples = (pool.empty(offset, np.result_type(*[x for _, x, _ in arrays])),
+                       pool.empty(offset, np.result_type(*[y for _, _, y in arrays])))
+            shared_x, shared_y = pool.view(samples[0]), pool.view(samples[1])
+            for (start, stop), samples_x, samples_y in arrays:
+                shared_x[start:stop] = samples_x
+                shared_y[start:stop] = samples_y
+            del shared_x, shared_y
+        has_converged = pool.empty((len(tasks), nb_measures), bool)
+        measures = pool.empty((len(tasks), nb_measures), np.float64)
+
+        start = time.perf_counter()
+        chunksize = max(1, len(tasks) // (4 * (jobs or os.cpu_count() or 1)))
+        list(pool.map(_analysis_metric_task,
+                      [(run, samples, (row, has_converged, measures), metric, convergence)
+                       for row, run in enumerate(tasks)],
+                      chunksize=chunksize))
+        if verbose:
+            print('%i runs analysed in %.3f s' % (len(tasks), time.perf_counter() - start))
+
+        has_converged = pool.view(has_converged).copy()
+        measures = pool.view(measures).copy()
+
+    if not multiple_measures:
+        has_converged, measures = has_converged[:,0], measures[:,0]
+    return has_converged, measures
 
 # ----------------------------------------------------------------------------------------------------------------------------
 # ANALYSIS_KPI
@@ -678,8 +1680,9 @@ def analysis_kpi(data,
 
     Parameters
     ----------
-    data : 1-d np.array or list
-        The metric data for a series of run.
+    data : 1-d np.array, list or SortedSample
+        The metric data for a series of run. A `SortedSample` shares its
+        sort, stationarity tests and CI indices across calls.
     KPI : dictionary
         TriScale KPI dictionary.
         Compulsory keys:
@@ -748,11 +1751,16 @@ def analysis_kpi(data,
     # Input checks
     ##
 
-    # Define as np array
-    data = np.array(data)
+    # Work on a copy: the caller's dictionary is not modified
+    KPI = dict(KPI)
 
-    # Remove nan's
-    data = data[~np.isnan(data)]
+    # Sorted data, without nan's
+    if isinstance(data, SortedSample):
+        sample = data
+    else:
+        sample = SortedSample(data)
+    data = sample.data
+    sorted_data = sample.sorted
 
     # Force one-sided CI for the KPI
     if 'class' in KPI:
@@ -772,12 +1780,8 @@ def analysis_kpi(data,
                 raise ValueError("If the median is used as percentile, \n"
                              "\t\tspecify the desired 'bound': 'lower' of 'upper'")
 
-    if 'bounds' not in KPI:
-        KPI['bounds'] = [data.min(), data.max()]
-
     # For now, we assume the inputs are correct...
     output_log = ''
-    sorted_data = np.sort(data)
 
     ##
     # Independence test
@@ -791,14 +1795,8 @@ def analysis_kpi(data,
         return weak_stationary, np.nan
 
     # Step 1: weak stationarity
-    weak_stationary, trend, tol = convergence_test(np.arange(len(data)),
-                                       np.array(data),
-                                       KPI['bounds'],
-                                       50,
-                                       10)
-
     # Step 2: independence
-    stationary = independence_test(data)
+    stationary, (weak_stationary, trend, tol) = sample.stationarity(KPI.get('bounds'))
     # print(weak_stationary,stationary)
     # if not weak_stationary:
     #     print(weak_stationary,stationary)
@@ -832,11 +1830,10 @@ def analysis_kpi(data,
     ##
     # Compute the KPI
     ##
-    LB,UB = ThompsonCI(len(data),
-                           KPI['percentile'],
-                           KPI['confidence'],
-                           KPI['class'],
-                           verbose)
+    LB,UB = sample.CI(KPI['percentile'],
+                      KPI['confidence'],
+                      KPI['class'],
+                      verbose)
     if KPI['bound'] == 'lower':
         KPI_CI = LB
     else:
@@ -846,12 +1843,14 @@ def analysis_kpi(data,
     # Plots
     ##
 
-    layout = go.Layout(width=500)
-    if 'name' in KPI:
-        layout.update(title=KPI['name'])
-
     if to_plot is not None and not np.isnan(KPI_CI):
 
+        import plotly.graph_objects as go
+        from triplots import theil_plot, autocorr_plot, ThompsonCI_plot
+        layout = go.Layout(width=500)
+        if 'name' in KPI:
+            layout.update(title=KPI['name'])
+
         if 'series' in to_plot:
             figure = theil_plot(
                 np.array(data),
@@ -880,10 +1879,10 @@ def analysis_kpi(data,
             layout.update(custom_layout)
         if not np.isnan(KPI_CI):
             if 'horizontal' in to_plot:
-                figure = ThompsonCI_plot( data, [LB,UB], KPI['bound'], 'horizontal', layout, out_name=plot_out_name)
+                figure = ThompsonCI_plot( sample, [LB,UB], KPI['bound'], 'horizontal', layout, out_name=plot_out_name)
                 figure.show()
             if 'vertical' in to_plot:
-                figure = ThompsonCI_plot( data, [LB,UB], KPI['bound'], 'vertical', layout, out_name=plot_out_name)
+                figure = ThompsonCI_plot( sample, [LB,UB], KPI['bound'], 'vertical', layout, out_name=plot_out_name)
                 figure.show()
 
     ##
@@ -909,8 +1908,9 @@ def analysis_variability(data,
 
     Parameters
     ----------
-    data : 1-d np.array or list
-        The metric data for a series of run.
+    data : 1-d np.array, list or SortedSample
+        The metric data for a series of run. A `SortedSample` shares its
+        sort, stationarity tests and CI indices across calls.
     score : dictionary
         TriScale score dictionary.
         Compulsory keys:
@@ -969,14 +1969,16 @@ def analysis_variability(data,
     if verbose:
         print('%s' % todo)
 
-    # Define as np array
-    data = np.array(data)
+    # Work on a copy: the caller's dictionary is not modified
+    score = dict(score)
 
-    # Remove nan's
-    data = data[~np.isnan(data)]
-
-    if 'bounds' not in score:
-        score['bounds'] = [data.min(),data.max()]
+    # Sorted data, without nan's
+    if isinstance(data, SortedSample):
+        sample = data
+    else:
+        sample = SortedSample(data)
+    data = sample.data
+    sorted_data = sample.sorted
 
     ##
     # Independence test
@@ -986,12 +1988,7 @@ def analysis_variability(data,
         print("Invalid KPI data (only one data point)")
         return weak_stationary, np.nan, np.nan, np.nan, np.nan
 
-    weak_stationary, trend, tol = convergence_test(np.arange(len(data)),
-                                       np.array(data),
-                                       score['bounds'],
-                                       50,
-                                       10)
-    stationary = independence_test(data)
+    stationary, (weak_stationary, trend, tol) = sample.stationarity(score.get('bounds'))
     stationary = (stationary and weak_stationary)
 
     output_log = ''
@@ -1001,7 +1998,7 @@ def analysis_variability(data,
         # Check whether the data points have all the same value
         # -> This leads the stationarity test to fail
         # -> TriScale considers this as valid, but raises a warning.
-        if data[0] == data[-1]:
+        if sample.constant:
             stationary = True
             output_log += ('All data points are the same. Considered stationary.\n')
             output_log += ('(but maybe you want to double-check that the data is really constant...)\n')
@@ -1015,18 +2012,16 @@ def analysis_variability(data,
     ##
     # Compute the repeatability bounds
     ##
-    variability_bound = ThompsonCI(len(data),
-                                   score['percentile'],
-                                   score['confidence'],
-                                   'two-sided',
-                                   verbose)
+    variability_bound = sample.CI(score['percentile'],
+                                  score['confidence'],
+                                  'two-sided',
+                                  verbose)
 
     ##
     # Compute the score
     ##
-    sorted_data = np.sort(data)
     if variability_bound[0] is not np.nan:
-        variability_bound_values = [ data[variability_bound[k]] for k in [0,1] ]
+        variability_bound_values = [ sorted_data[variability_bound[k]] for k in [0,1] ]
         variability_score = sorted_data[variability_bound[1]] - sorted_data[variability_bound[0]]
     else:
         variability_score = np.nan
@@ -1040,6 +2035,8 @@ def analysis_variability(data,
     ##
     if to_plot is not None:
 
+        import plotly.graph_objects as go
+        from triplots import theil_plot, autocorr_plot, ThompsonCI_plot
         layout = go.Layout(
             width=500,
         )
@@ -1072,10 +2069,10 @@ def analysis_variability(data,
             layout.update(custom_layout)
         if not np.isnan(variability_bound[0]):
             if 'horizontal' in to_plot:
-                figure = ThompsonCI_plot( data, variability_bound, 'two-sided', 'horizontal', layout, out_name=plot_out_name)
+                figure = ThompsonCI_plot( sample, variability_bound, 'two-sided', 'horizontal', layout, out_name=plot_out_name)
                 figure.show()
             if 'vertical' in to_plot:
-                figure = ThompsonCI_plot( data, variability_bound, 'two-sided', 'vertical', layout, out_name=plot_out_name)
+                figure = ThompsonCI_plot( sample, variability_bound, 'two-sided', 'vertical', layout, out_name=plot_out_name)
                 figure.show()
 
     return stationary, variability_bound_values[0], variability_bound_values[1], variability_score, relative_score
@@ -1083,138 +2080,488 @@ def analysis_variability(data,
 
 
 # ----------------------------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------------
+# ANALYSIS_GROUPS
 # ----------------------------------------------------------------------------------------------------------------------------
 
+def analysis_groups(data,
+                    keys,
+                    KPIs=None,
+                    scores=None,
+                    verbose=False):
+    """
+    Computation of KPIs and variability scores, as suggested by TriScale [1],
+    for all groups of a long-format table.
+
+    Each row of `data` is one run; the `keys` columns identify the series
+    (e.g., the congestion-control scheme) and the value columns contain the
+    metric values of each run. For every group and every value column, the
+    function performs the same analysis as `analysis_kpi` and/or
+    `analysis_variability`.
+
+    All groups are processed at once: the rows are sorted once by
+    (group, value), and the KPIs and variability scores are obtained with
+    vectorized index arithmetic on the group segments. The independence
+    tests are computed on all groups at once (one batched FFT), and the
+    weak stationarity tests with one vectorized Theil-Sen regression per
+    distinct group size.
 
+    Parameters
+    ----------
+    data : pandas DataFrame
+        Long-format table, with one row per run.
+    keys : string or list of strings
+        Column(s) defining the groups.
+    KPIs : dictionary or None, optional
+        Maps value column names to TriScale KPI dictionaries
+        (see `analysis_kpi`).
+        Default : None
+    scores : dictionary or None, optional
+        Maps value column names to TriScale score dictionaries
+        (see `analysis_variability`).
+        Default : None
+    verbose : True/False, optional
+        When true, print non-functional and intermediary outputs.
+        Default : False
 
-# Below are undocumented and (possibly) non-functional TriScale functions
+    Returns
+    -------
+    results : pandas DataFrame
+        One row per group, indexed by the group keys. For each value
+        column `col`, the columns are
+        - (col, 'samples') : number of valid (non-NaN) values
+        - (col, 'stationary') : outcome of the stationarity tests
+        - (col, 'KPI') : the KPI value, if a KPI is defined for `col`
+        - (col, 'score_lower'), (col, 'score_upper'), (col, 'score'),
+        (col, 'relative_score') : the bounds of the CI defining the
+        variability score, the score, and the relative score, if a score
+        is defined for `col`
+        Values are NaN when there are not enough data points.
 
+    References
+    ----------
+    .. [1] Anonymous, "TriScale: A Framework Supporting Reproducible
+        Performance Evaluations in Networking", 2020,
+        https://doi.org/10.5281/zenodo.3464273
 
+    """
+
+    ##
+    # Checking the inputs
+    ##
+    if not isinstance(data, pd.DataFrame):
+        raise ValueError("Wrong input type. Expect a DataFrame, got "+repr(type(data))+".")
+    if isinstance(keys, str):
+        keys = [keys]
+    if KPIs is None:
+        KPIs = {}
+    if scores is None:
+        scores = {}
+    value_columns = list(KPIs) + [col for col in scores if col not in KPIs]
+    for col in value_columns + keys:
+        if col not in data.columns:
+            raise ValueError("Input DataFrame must contain a column named "+repr(col)+".")
+
+    # Group codes, in the order of first appearance
+    codes, groups = pd.MultiIndex.from_frame(data[keys]).factorize()
+    nb_groups = len(groups)
+    if len(keys) == 1:
+        groups = groups.get_level_values(0)
+
+    results = {}
+    for col in value_columns:
+
+        values = data[col].values.astype(float)
+        valid = ~np.isnan(values)
+        col_codes = codes[valid]
+        col_values = values[valid]
+        counts = np.bincount(col_codes, minlength=nb_groups)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        ##
+        # Single sort by (group, value)
+        ##
+        sorted_values = col_values[np.lexsort((col_values, col_codes))]
+        constant = np.zeros(nb_groups, dtype=bool)
+        has_data = counts > 0
+        constant[has_data] = (sorted_values[starts[has_data]]
+                              == sorted_values[starts[has_data]+counts[has_data]-1])
+
+        ##
+        # Stationarity tests
+        ##
+        # Runs of each group, in their original order, padded with NaN
+        order = np.argsort(col_codes, kind='stable')
+        positions = np.arange(len(order)) - starts[col_codes[order]]
+        runs = np.full((nb_groups, max(counts.max(), 1)), np.nan)
+        runs[col_codes[order], positions] = col_values[order]
+
+        # Independence, all groups at once
+        autocorr, iid_bounds = masked_autocorr(runs, counts[:,np.newaxis])
+        independent = ~(np.abs(autocorr[:,1:]) >= iid_bounds[:,1:]).any(axis=1)
+
+        # Weak stationarity, one regression per group size
+        if col in KPIs and 'bounds' in KPIs[col]:
+            fixed_bounds = KPIs[col]['bounds']
+        elif col not in KPIs and 'bounds' in scores[col]:
+            fixed_bounds = scores[col]['bounds']
+        else:
+            fixed_bounds = None
+        weak_stationary = np.zeros(nb_groups, dtype=bool)
+        for size in np.unique(counts[counts >= 2]):
+            rows = np.flatnonzero((counts == size) & ~constant)
+            if not len(rows):
+                continue
+            if fixed_bounds is None:
+                y_bounds = [[sorted_values[starts[k]], sorted_values[starts[k]+size-1]] for k in rows]
+            else:
+                y_bounds = [fixed_bounds]*len(rows)
+            tests = convergence_test_rows(np.arange(size),
+                                          runs[rows,:size],
+                                          y_bounds,
+                                          50,
+                                          10)
+            weak_stationary[rows] = [test[0] for test in tests]
+
+        stationary = (independent & weak_stationary) | constant
+        stationary[counts < 2] = False
+
+        results[(col, 'samples')] = counts
+        results[(col, 'stationary')] = stationary
+
+        ##
+        # KPI and variability score, with index arithmetic
+        ##
+        def group_values(CI_class, percentile, confidence, side):
+            # Index of the bound for each group size, computed once per size
+            index = np.full(nb_groups, -1)
+            for size in np.unique(counts[counts >= 2]):
+                LB, UB = ThompsonCI(int(size), percentile, confidence, CI_class)
+                bound = LB if side == 'lower' else UB
+                if not np.isnan(bound):
+                    index[counts == size] = bound
+            output = np.full(nb_groups, np.nan)
+            found = index >= 0
+            output[found] = sorted_values[starts[found] + index[found]]
+            return output
+
+        if col in KPIs:
+            KPI = KPIs[col]
+            if 'bound' in KPI:
+                side = KPI['bound']
+            elif KPI['percentile'] > 50:
+                side = 'upper'
+            elif KPI['percentile'] < 50:
+                side = 'lower'
+            else:
+                raise ValueError("If the median is used as percentile, \n"
+                                 "\t\tspecify the desired 'bound': 'lower' of 'upper'")
+            results[(col, 'KPI')] = group_values('one-sided',
+                                                 KPI['percentile'],
+                                                 KPI['confidence'],
+                                                 side)
+
+        if col in scores:
+            score = scores[col]
+            lower = group_values('two-sided', score['percentile'], score['confidence'], 'lower')
+            upper = group_values('two-sided', score['percentile'], score['confidence'], 'upper')
+            results[(col, 'score_lower')] = lower
+            results[(col, 'score_upper')] = upper
+            results[(col, 'score')] = upper - lower
+            results[(col, 'relative_score')] = (upper - lower) / ((upper + lower)/2)
+
+    results = pd.DataFrame(results, index=groups)
+    results.index.names = keys
+
+    if verbose:
+        print(results)
+
+    return results
 
 # ----------------------------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------------
+# ANALYSIS_KPI_POOLED
 # ----------------------------------------------------------------------------------------------------------------------------
 
+def analysis_kpi_pooled(series,
+                        KPI,
+                        verbose=False):
+    """
+    Computation of a KPI, as suggested by TriScale [1], on the data of
+    several series pooled together.
 
-def analysis_report(data, meta_data, output_file_name=None):
-    '''
-    Prepare and output the TriScale performance report based on the profided data, which may be
-    - a list (of list) of file names, which contain the raw data
-    - a list (of list) of values, which are the metric values for each run and series
-    - a list of values, which are the KPI for each series
-    '''
+    The series must already be sorted (e.g., by `np.sort`, which places NaN
+    values at the end; these are ignored). The pooled data is never
+    concatenated: the order statistic defining the KPI is found by a k-way
+    selection over the sorted series, in O(k log n) per step for O(log N)
+    steps (k series of length up to n, N values in total).
 
-    todo = ''
-    todo += '# ---------------------------------------------------------------- \n'
-    todo += '# TODO analysis_report \n'
-    todo += '# ---------------------------------------------------------------- \n'
-    todo += '- finish the doctring\n'
-    todo += '- check input files\n'
-    todo += '# ---------------------------------------------------------------- \n'
+    No stationarity test is performed, as the pooled data does not form a
+    series; use `analysis_kpi` on each series for that.
 
-    if verbose:
-        print('%s' % todo)
+    Parameters
+    ----------
+    series : list of sorted 1-d np.array or SortedSample
+        The sorted metric data of each series.
+    KPI : dictionary
+        TriScale KPI dictionary (see `analysis_kpi`).
+    verbose : True/False, optional
+        When true, print non-functional and intermediary outputs.
+        Default : False
+
+    Returns
+    -------
+    KPI_out : float or NaN
+        NaN if there are not enough data points to compute the KPI,
+        computed KPI value otherwise.
+
+    References
+    ----------
+    .. [1] Anonymous, "TriScale: A Framework Supporting Reproducible
+        Performance Evaluations in Networking", 2020,
+        https://doi.org/10.5281/zenodo.3464273
+
+    """
 
     ##
     # Input checks
     ##
+    if 'class' in KPI and KPI['class'] != 'one-sided':
+        raise ValueError("TriScale KPIs can only have 'class' 'one-sided'.")
+    if 'bound' in KPI:
+        bound = KPI['bound']
+    elif KPI['percentile'] > 50:
+        bound = 'upper'
+    elif KPI['percentile'] < 50:
+        bound = 'lower'
+    else:
+        raise ValueError("If the median is used as percentile, \n"
+                         "\t\tspecify the desired 'bound': 'lower' of 'upper'")
+
+    # Sorted data, without the trailing nan's (no copy)
+    sorted_series = []
+    for data in series:
+        if isinstance(data, SortedSample):
+            data = data.sorted
+        else:
+            data = np.asarray(data, dtype=float)
+            data = data[:np.searchsorted(data, np.nan)]
+        sorted_series.append(data)
+    n_samples = sum(len(data) for data in sorted_series)
 
-    # format of meta_data? probably a dictionary...
-    metric = {'name': 'Throuput',
-          'unit': 'MBit/s',
-          'measure': 95,
-          'bounds': [0,120]}
-    convergence = {'expected': True,
-                   'confidence': 95,  # in %
-                   'tolerance': 5,    # in %
-                  }
-    KPI = {'percentile': 50,
-           'confidence': 75,
-           'class': 'one-sided',
-           'side': 'lower'}
-    confidence_repeatability = 75
-
-
-    # for now we write the case with list of csv files name
+    if verbose:
+        print('Pooled data: %i series, %i data points' % (len(sorted_series), n_samples))
+    if n_samples < 2:
+        print("Invalid metric data (less than two data points)")
+        return np.nan
 
     ##
-    # Preprocessing
+    # Compute the KPI
     ##
-    metric_all = []
-    for series in data:
-        metric_series = []
-        for run in series:
-            converged, metric_run = analysis_preprocessing(run,
-                                                     metric,
-                                                     plot=False,
-                                                     convergence=convergence,
-                                                     verbose=False)
-            if converged is True:
-                metric_series.append(metric_run)
-            else:
-                metric_series.append(np.nan)
+    LB,UB = ThompsonCI(n_samples,
+                       KPI['percentile'],
+                       KPI['confidence'],
+                       'one-sided',
+                       verbose)
+    if bound == 'lower':
+        KPI_CI = LB
+    else:
+        KPI_CI = UB
 
-        metric_all.append(metric_series)
+    if np.isnan(KPI_CI):
+        return np.nan
+    return pooled_order_statistic(sorted_series, int(KPI_CI))
 
+# ----------------------------------------------------------------------------------------------------------------------------
+# ANALYSIS_REPORT
+# ----------------------------------------------------------------------------------------------------------------------------
 
+def analysis_report(data,
+                    meta_data,
+                    output_file_name=None,
+                    jobs=1,
+                    print_output=True,
+                    verbose=False):
+    """
+    Prepare and output the TriScale performance report [1].
+
+    The analysis is a pipeline of three stages:
+    1. the metric of each run (`analysis_metric`), computed in parallel
+    by `jobs` threads;
+    2. the KPI of each series (`analysis_kpi`);
+    3. the variability score across series (`analysis_variability`).
+    The stages are streamed: the KPI of a series is computed as soon as
+    the metrics of its runs are available, while the following runs are
+    still being processed. Only one value per run is kept in memory, so the
+    memory footprint does not grow with the size of the raw data.
 
-    # artificial data for debugging
-    metric_series = np.array([10,9,10,10,8,12,65,12,10])
-    metric_all = [metric_series+0.1,
-                  metric_series+0.3,
-                  metric_series+0.07,
-                  metric_series-0.2,
-                  metric_series+0.13,
-                  metric_series-0.34]
+    Parameters
+    ----------
+    data : list
+        The data to analyse, which may be
+        - a list (of series) of lists (of runs) of raw data inputs, i.e.,
+        any input accepted by `analysis_metric` (csv file names, DataFrames,
+        tuples of arrays);
+        - a list (of series) of lists (of runs) of metric values;
+        - a list of KPI values (one per series).
+        The pipeline starts at the corresponding stage.
+    meta_data : dictionary
+        Description of the analysis and of the evaluation.
+        - "metric" : TriScale metric dictionary (see `analysis_metric`).
+        Compulsory when `data` contains raw data.
+        - "convergence" : TriScale convergence dictionary, optional
+        (see `analysis_metric`). The metric of runs that do not converge is
+        discarded (NaN).
+        - "KPI" : TriScale KPI dictionary (see `analysis_kpi`).
+        Compulsory unless `data` contains KPI values.
+        - "score" : TriScale score dictionary (see `analysis_variability`),
+        optional. When absent, no variability score is computed.
+        - "protocol", "network", "description" : strings, optional.
+        Labels for the report.
+        - "series" : list of strings, optional. Labels of the series.
+    output_file_name : string or None, optional
+        When a string, the report is written to that file.
+        Default : None
+    jobs : integer, optional
+        Number of threads computing the metrics of the runs.
+        Default : 1
+    print_output : True/False, optional
+        When True, prints the report.
+        Default : True
+    verbose : True/False, optional
+        When true, print non-functional and intermediary outputs.
+        Default : False
 
-#     print(metric_all)
+    Returns
+    -------
+    results : dictionary
+        - "metrics" : list of np.array, the metric values of each series
+        (None when `data` contains KPI values)
+        - "KPIs" : np.array, the KPI of each series
+        - "stationary" : np.array, the outcome of the stationarity test of
+        each series (None when `data` contains KPI values)
+        - "variability" : the output of `analysis_variability` on the KPIs,
+        or None
+        - "timing" : dictionary, time spent (in seconds) in the calls of
+        each stage ('metrics', 'KPIs', 'variability'), excluding the waits
+        on the other stages. The metric calls are timed in the worker
+        threads and summed over the runs: with `jobs` > 1, they overlap,
+        and their total can exceed the elapsed time.
+        - "report" : string, the textual report
 
-    ##
-    # Performance evaluation
-    ##
-    KPI_series = []
-    for series in metric_all:
-        stationary, KPI_bounds = analysis_kpi(series, KPI, verbose=False)
-        if stationary is True:
-            series.sort()
-            if KPI['side'] == 'lower':
-                KPI_series.append(series[KPI_bounds[1]])
-            else:
-                KPI_series.append(series[KPI_bounds[0]])
-        else:
-            KPI_series.append(np.nan)
+    References
+    ----------
+    .. [1] Anonymous, "TriScale: A Framework Supporting Reproducible
+        Performance Evaluations in Networking", 2020,
+        https://doi.org/10.5281/zenodo.3464273
+
+    """
 
     ##
-    # Repeatability
+    # Input checks
     ##
-    to_plot = None
-    stationary, repeatability_mean_value, repeatability_bounds, repeatability_score = analysis_repeatability(KPI_series, confidence_repeatability, verbose=False, to_plot=to_plot)
+    if not isinstance(meta_data, dict):
+        raise ValueError("Wrong meta_data type. Expect a dictionary, got "+repr(meta_data)+".")
+    if len(data) == 0:
+        raise ValueError("No data to analyse.")
+
+    # Stage at which the pipeline starts
+    first_series = data[0]
+    if np.ndim(first_series) == 0 and not isinstance(first_series, (str, pd.DataFrame, tuple)):
+        input_stage = 'KPIs'
+    elif all(np.ndim(run) == 0 and not isinstance(run, str) for run in first_series):
+        input_stage = 'metrics'
+    else:
+        input_stage = 'raw'
+
+    if input_stage == 'raw' and 'metric' not in meta_data:
+        raise ValueError("meta_data must contain a 'metric' dictionary to analyse raw data.")
+    if input_stage != 'KPIs' and 'KPI' not in meta_data:
+        raise ValueError("meta_data must contain a 'KPI' dictionary.")
 
+    metric = meta_data.get('metric', {})
+    KPI = meta_data.get('KPI', {})
+    score = meta_data.get('score')
+    series_labels = meta_data.get('series',
+                                  ['Serie %i' % k for k in range(len(data))])
+    timing = {'metrics': 0., 'KPIs': 0., 'variability': 0.}
 
     ##
-    # Produce the performance report
+    # Stages 1 and 2: metric of each run, KPI of each series
     ##
+    if input_stage == 'KPIs':
+        metric_all = None
+        stationary_all = None
+        KPI_series = np.asarray(data, dtype=float)
 
-    # these info should be in the meta_data
-    # get inspiration from Pantheon json file
-    protocol_name = 'BBR'
-    network_name = 'PantheonXYZ'
-    metric_label = 'Throughput'
-    KPI_label = '95% CI on 85th percentile'
-    metric_desc = 'description to fetch from some dictionary sdfsdfsdf  sdfsdf sdfsdfs sdfsdfsdfsdfsdf  sdfsdf sdfsdfs sdfsdfsdfsdfsdf  sdfsdf sdfsdfs sdfsdfsdfsdfsdf  sdfsdf sdfsdfs sdfsdfsdfsdfsdf  sdfsdf sdfsdfs sdfsdfsdfsdfsdf  sdfsdf sdfsdfs sdfsdfsdfsdfsdf  sdfsdf sdfsdfs sdfsdfsdfsdfsdf  sdfsdf sdfsdfs sdfsdf'
+    else:
 
-    serie_ids = range(len(data))
-    serie_labels = []
-    for ids in serie_ids:
-        serie_labels.append('Serie '+str(ids))
+        def run_metric(run):
+            # Timed in the worker: only the run's own analysis is counted
+            start = time.perf_counter()
+            converged, metric_run, _ = analysis_metric(run,
+                                                       metric,
+                                                       convergence=meta_data.get('convergence'))
+            return (metric_run if converged else np.nan), time.perf_counter() - start
+
+        executor = None
+        if input_stage == 'raw':
+            # Lazy iterator over the metrics of all runs, in order
+            if jobs > 1:
+                executor = concurrent.futures.ThreadPoolExecutor(jobs)
+                runs = executor.map(run_metric, [run for series in data for run in series])
+            else:
+                runs = map(run_metric, [run for series in data for run in series])
 
-    if KPI['side'] == 'lower':
-        direction = 'less or equal to'
+        metric_all = []
+        stationary_all = []
+        KPI_series = []
+        try:
+            for series in data:
+
+                if input_stage == 'raw':
+                    metric_runs = [next(runs) for _ in series]
+                    metric_series = np.array([value for value, _ in metric_runs], dtype=float)
+                    timing['metrics'] += sum(duration for _, duration in metric_runs)
+                else:
+                    metric_series = np.asarray(series, dtype=float)
+
+                start = time.perf_counter()
+                stationary, KPI_value = analysis_kpi(metric_series, KPI, verbose=verbose)
+                timing['KPIs'] += time.perf_counter() - start
+
+                metric_all.append(metric_series)
+                stationary_all.append(stationary)
+                KPI_series.append(KPI_value)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        stationary_all = np.array(stationary_all)
+        KPI_series = np.array(KPI_series, dtype=float)
+
+    ##
+    # Stage 3: variability across series
+    ##
+    variability = None
+    if score is not None:
+        start = time.perf_counter()
+        variability = analysis_variability(KPI_series, score, verbose=verbose)
+        timing['variability'] += time.perf_counter() - start
+
+    ##
+    # Produce the performance report
+    ##
+    protocol_name = meta_data.get('protocol', '-')
+    network_name = meta_data.get('network', '-')
+    metric_label = metric.get('name', meta_data.get('metric_name', '-'))
+    metric_unit = metric.get('unit', '')
+    if 'bound' in KPI:
+        bound = KPI['bound']
     else:
+        bound = 'upper' if KPI.get('percentile', 100) > 50 else 'lower'
+    if bound == 'lower':
         direction = 'greater or equal to'
+    else:
+        direction = 'less or equal to'
 
     analysis_output = ''
     analysis_output += '# ---------------------------------------------------------------- \n'
@@ -1223,68 +2570,83 @@ def analysis_report(data, meta_data, output_file_name=None):
     analysis_output += 'Protocol \t%s\n' % (protocol_name)
     analysis_output += 'Network \t%s\n' % (network_name)
     analysis_output += 'Metric \t\t%s\n' % (metric_label)
-    analysis_output += 'defined as \t%s\n' % (metric_desc)
-    analysis_output += 'KPI\t\t%s\n' % (KPI_label)
+    if 'description' in meta_data:
+        analysis_output += 'defined as \t%s\n' % (meta_data['description'])
+    if KPI:
+        analysis_output += 'KPI\t\t%g%% CI on %g-th percentile\n' % (KPI['confidence'],
+                                                                   KPI['percentile'])
     analysis_output += '# ---------------------------------------------------------------- \n'
     analysis_output += '\n'
-    analysis_output += 'For the different series, with a confidence level of %g%%,\n' % KPI['confidence']
-    analysis_output += 'the %g-th percentile of the %s metric \n' % (
-       KPI['percentile'],
-       metric_label)
-
-    analysis_output += 'in a run of %s is %s\n' % (
-       protocol_name,
-       direction)
-    analysis_output += '\n'
-
-    analysis_output += '%s :\t%f\t%s\n' % (
-        serie_labels[0],
-        KPI_series[0],
-        metric['unit'])
-    for serie_cnt in range(1,len(data)):
-        analysis_output += '%s :\t%f\n' % (
-            serie_labels[serie_cnt],
-            KPI_series[serie_cnt])
-
+    if KPI:
+        analysis_output += 'For the different series, with a confidence level of %g%%,\n' % KPI['confidence']
+        analysis_output += 'the %g-th percentile of the %s metric \n' % (
+           KPI['percentile'],
+           metric_label)
+        analysis_output += 'in a run of %s is %s\n' % (
+           protocol_name,
+           direction)
+        analysis_output += '\n'
+    for serie_cnt in range(len(KPI_series)):
+        analysis_output += '%s :\t%f\t%s' % (
+            series_labels[serie_cnt],
+            KPI_series[serie_cnt],
+            metric_unit)
+        if stationary_all is not None and not stationary_all[serie_cnt]:
+            analysis_output += '\t(NOT stationary)'
+        analysis_output += '\n'
     analysis_output += '\n'
-
-#     if repeatable:
-#         flag_repeatability = ''
-#     else:
-#         flag_repeatability = 'NOT '
-
-#     analysis_output += 'Given a tolerance of %g%%, these results are %s%g%%-repeatable.\n' %             (tolerance_repeatability,
-#              flag_repeatability,
-#              confidence_repeatability)
-
     analysis_output += '# ---------------------------------------------------------------- \n'
-    analysis_output += '\n'
 
-    if stationary:
-        analysis_output += 'With a confidence level of %g%%, \n' % KPI['confidence']
+    if variability is not None:
+        analysis_output += '\n'
+        if not variability[0]:
+            analysis_output += 'The KPIs of the different series do NOT appear i.i.d.\n'
+            analysis_output += 'The variability score is not trustworthy...\n\n'
+        analysis_output += 'With a confidence level of %g%%, \n' % score['confidence']
         analysis_output += ('the evaluation of %s %s on %s results in\n'
                             % (protocol_name,
                                metric_label,
                                network_name))
-        analysis_output += ('Value :\t\t    %f \t%s \n'
-                            % (repeatability_mean_value, metric['unit']) )
-        analysis_output += ('Rep. Score :\t+/- %f \n'
-                            % (repeatability_score) )
-
-#         analysis_output += 'the repeatability score is\n'
-#         analysis_output += ('Rep. Score :\t+/- %f \t%s \n'
-#                             % (repeatability_score, metric['unit']) )
-#         analysis_output += ('Rep. Score :\t+/- %f \t%s \n'
-#                             % (repeatability_bounds[1], metric['unit']) )
-    else:
-        analysis_output += 'to be handled\n'
-    analysis_output += '\n'
+        analysis_output += ('Var. score :\t%f \t%s \n'
+                            % (variability[3], metric_unit))
+        analysis_output += ('Rel. score :\t%f \n'
+                            % (variability[4]))
+        analysis_output += '\n'
+        analysis_output += '# ---------------------------------------------------------------- \n'
+
+    analysis_output += '\nTime spent per stage (summed over the calls)\n'
+    for stage in ['metrics', 'KPIs', 'variability']:
+        analysis_output += '%s\t%.3f s\n' % (stage.ljust(12), timing[stage])
     analysis_output += '# ----------------------------------------------------------------'
 
-#     if print_output:
-    print(analysis_output)
+    if print_output:
+        print(analysis_output)
+    if output_file_name is not None:
+        with open(output_file_name, 'w') as output_file:
+            output_file.write(analysis_output + '\n')
+
+    return {'metrics': metric_all,
+            'KPIs': KPI_series,
+            'stationary': stationary_all,
+            'variability': variability,
+            'timing': timing,
+            'report': analysis_output}
+
+# ----------------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------------
+
+
+
+# Below are undocumented and (possibly) non-functional TriScale functions
+
+
 
-    return
+# ----------------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------------
 
 
 def analysis(data,
@@ -1464,9 +2826,10 @@ def analysis(data,
     ##
     # Compute CI for the entire data set and plot
     ##
-#     data_all = [item for sublist in data for item in sublist]
-#     print(data_all)
-#     CI_bounds_final = ci( [data_all], percentile, confidence_percentile, plot=True, bound_side=bound_side )
+#     KPI_final = analysis_kpi_pooled( [np.sort(series) for series in data],
+#                                      {'percentile': percentile,
+#                                       'confidence': confidence_percentile,
+#                                       'bound': bound_side} )
 
     ##
     # Produce the outputs
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+TriScale command line
+
+Runs the stages of a TriScale analysis on batches of data files, e.g.,
+from cron jobs:
+
+    triscale_cli.py sizing      --spec spec.yml
+    triscale_cli.py profiling   --spec spec.yml 'profiling/*.csv'
+    triscale_cli.py metric      --spec spec.yml --jobs 8 'runs/**/*.csv'
+    triscale_cli.py kpi         --spec spec.yml 'metrics/*.csv'
+    triscale_cli.py variability --spec spec.yml 'kpis/*.csv'
+
+The YAML spec holds the TriScale dictionaries of the stages, with the same
+keys as in `analysis_report`:
+
+    sizing:                 # one or a list of experiment_sizing inputs
+      percentile: 50
+      confidence: 95
+      robustness: 0         # optional
+    profiling:              # network_profiling inputs
+      bounds: [0, 100]
+      name: PRR             # optional
+      max_window: null      # optional
+    metric: {...}           # see analysis_metric
+    convergence: {...}      # see analysis_metric (optional)
+    KPI: {...}              # see analysis_kpi
+    score: {...}            # see analysis_variability
+
+The inputs are glob patterns (quote them; '**' matches subdirectories),
+or paths to members of zip archives. The files are processed in parallel
+by `--jobs` threads, and one JSON object per file is written to stdout
+(or `--output`) as soon as it is available, in the order of the inputs.
+Failures are reported as an "error" field; the exit status is then 1.
+Patterns matching no file are failures too (one object per pattern,
+written first).
+
+Plotting libraries are not imported. `--backend numba` runs the regressions
+and window measures on the optional Numba kernels (see `set_backend`).
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import itertools
+import json
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+import yaml
+
+import triscale
+from helpers import open_data, split_archive_path
+
+STAGES = ['sizing', 'profiling', 'metric', 'kpi', 'variability']
+
+def jsonable(value):
+    """
+    Convert the outputs of TriScale's functions into JSON-compatible
+    objects: NumPy scalars and arrays, time stamps and time deltas
+    (as strings), and NaN (as null).
+    """
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    return str(value)
+
+def expand_inputs(patterns):
+    """
+    File names matching the glob `patterns`, in order, without duplicates,
+    and the list of the patterns matching no file.
+    """
+    files = []
+    unmatched = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches and split_archive_path(pattern)[1] is not None:
+            # Member of a zip archive
+            matches = [pattern]
+        if not matches:
+            unmatched.append(pattern)
+        files += [match for match in matches if match not in files]
+    return files, unmatched
+
+def read_values(file_name, column=0):
+    """Values of one column (name or position) of a csv file with a header line."""
+    with open_data(file_name) as input_file:
+        df = pd.read_csv(input_file)
+    if column in df.columns:
+        return df[column].values
+    return df.iloc[:, int(column)].values
+
+##
+# Stages
+##
+
+def run_sizing(spec):
+    entries = spec['sizing']
+    if isinstance(entries, dict):
+        entries = [entries]
+    for entry in entries:
+        N_one, N_two = triscale.experiment_sizing(entry['percentile'],
+                                                  entry['confidence'],
+                                                  entry.get('robustness', 0),
+                                                  entry.get('CI_class', 'one-sided'))
+        yield dict(entry, N_one=N_one, N_two=N_two)
+
+def run_profiling(spec, file_name, args):
+    profiling = spec['profiling']
+    _, _, profile = triscale.network_profiling(file_name,
+                                               profiling['bounds'],
+                                               name=profiling.get('name'),
+                                               max_window=profiling.get('max_window'),
+                                               return_profile=True,
+                                               plot=False)
+    if profile is None:
+        raise FileNotFoundError(file_name)
+    return profile
+
+def run_metric(spec, file_name, args):
+    has_converged, measure, _ = triscale.analysis_metric(file_name,
+                                                         spec['metric'],
+                                                         spec.get('convergence'))
+    return {'converged': has_converged, 'measure': measure}
+
+def run_kpi(spec, file_name, args):
+    stationary, KPI = triscale.analysis_kpi(read_values(file_name, args.column),
+                                            spec['KPI'])
+    return {'stationary': stationary, 'KPI': KPI}
+
+def run_variability(spec, file_name, args):
+    (stationary,
+     lower_bound,
+     upper_bound,
+     score,
+     relative_score) = triscale.analysis_variability(read_values(file_name, args.column),
+                                                     spec['score'])
+    return {'stationary': stationary,
+            'lower_bound': lower_bound,
+            'upper_bound': upper_bound,
+            'score': score,
+            'relative_score': relative_score}
+
+RUNNERS = {'profiling': run_profiling,
+           'metric': run_metric,
+           'kpi': run_kpi,
+           'variability': run_variability}
+
+def run_files(stage, spec, files, args):
+    """Yield the (JSON-compatible) result of `stage` for each file, in order."""
+    def task(file_name):
+        record = {'stage': stage, 'input': file_name}
+        try:
+            record.update(RUNNERS[stage](spec, file_name, args))
+        except Exception as error:
+            record['error'] = '%s: %s' % (type(error).__name__, error)
+        return jsonable(record)
+
+    if args.jobs > 1:
+        with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+            yield from executor.map(task, files)
+    else:
+        yield from map(task, files)
+
+##
+# Command line
+##
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(prog='triscale',
+                                     description='Batch TriScale analyses, with JSON-lines output.')
+    subparsers = parser.add_subparsers(dest='stage', required=True)
+    for stage in STAGES:
+        subparser = subparsers.add_parser(stage)
+        subparser.add_argument('--spec', required=True,
+                               help='YAML file with the TriScale dictionaries of the analysis')
+        subparser.add_argument('--output', '-o', default=None,
+                               help='JSON-lines output file (default: stdout)')
+        if stage != 'sizing':
+            subparser.add_argument('inputs', nargs='+',
+                                   help='glob patterns of the input files')
+            subparser.add_argument('--jobs', '-j', type=int, default=1,
+                                   help='number of files processed in parallel')
+            subparser.add_argument('--backend', choices=['auto', 'numba', 'numpy'], default='auto',
+                                   help='numeric kernels of the regressions and windows (default: auto)')
+        if stage in ['kpi', 'variability']:
+            subparser.add_argument('--column', default=0,
+                                   help='name or position of the column of values (default: 0)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    with open(args.spec) as spec_file:
+        spec = yaml.safe_load(spec_file) or {}
+    required = {'sizing': 'sizing',
+                'profiling': 'profiling',
+                'metric': 'metric',
+                'kpi': 'KPI',
+                'variability': 'score'}[args.stage]
+    if required not in spec:
+        print('triscale: the spec has no %r entry' % required, file=sys.stderr)
+        return 2
+
+    if args.stage != 'sizing':
+        try:
+            triscale.set_backend(args.backend)
+        except ImportError as error:
+            print('triscale: %s' % error, file=sys.stderr)
+            return 2
+
+    if args.stage == 'sizing':
+        records = (jsonable(dict(record, stage='sizing')) for record in run_sizing(spec))
+    else:
+        files, unmatched = expand_inputs(args.inputs)
+        # A pattern matching no file (e.g., a missing directory) is a failure
+        records = itertools.chain(({'stage': args.stage,
+                                    'input': pattern,
+                                    'error': 'FileNotFoundError: no file matches the pattern'}
+                                   for pattern in unmatched),
+                                  run_files(args.stage, spec, files, args))
+
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    failed = False
+    try:
+        for record in records:
+            failed = failed or 'error' in record
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())